@@ -0,0 +1,150 @@
+"""
+Matrices de covariance et de corrélation des rendements quotidiens.
+
+Les rendements sont centrés puis multipliés en un seul produit matriciel
+(BLAS) : Xᵀ·X / (n - 1). Les fenêtres glissantes se déduisent de sommes
+cumulées de X et de Xᵀ·X prises aux seules bornes des fenêtres : la
+mémoire reste en (fenêtres × tickers × tickers), quelle que soit la
+longueur des fenêtres.
+"""
+import numpy as np
+
+# Part minimale de jours cotés pour garder un ticker dans la matrice
+MIN_COVERAGE = 0.8
+
+# Fenêtres glissantes au plus par réponse
+MAX_WINDOWS = 250
+
+
+def clean_returns(returns, tickers):
+    """Écarte les tickers trop peu cotés puis les jours incomplets
+
+    Retourne (rendements sans NaN, tickers conservés, masque des jours gardés).
+    """
+    if returns.shape[0] == 0:
+        return returns, list(tickers), np.zeros(0, dtype=bool)
+
+    coverage = np.isfinite(returns).mean(axis=0)
+    keep = coverage >= MIN_COVERAGE
+    returns = returns[:, keep]
+    rows = np.isfinite(returns).all(axis=1)
+    kept = [t for t, k in zip(tickers, keep) if k]
+    return np.ascontiguousarray(returns[rows]), kept, rows
+
+
+def covariance_matrix(returns):
+    """Covariance (m × m) de rendements (n × m) sans NaN"""
+    n = returns.shape[0]
+    if n < 2:
+        return np.full((returns.shape[1],) * 2, np.nan)
+    centered = returns - returns.mean(axis=0)
+    return centered.T @ centered / (n - 1)
+
+
+def correlation_from_covariance(cov):
+    """Corrélation déduite de la covariance (diagonale forcée à 1)"""
+    std = np.sqrt(np.diag(cov))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = cov / np.outer(std, std)
+    np.fill_diagonal(corr, 1.0)
+    return corr
+
+
+def window_count(n, window, step=1):
+    """Nombre de fenêtres glissantes de window jours sur n jours"""
+    return max(0, (n - window) // step + 1)
+
+
+def rolling_covariances(returns, window, step=1):
+    """Covariances sur des fenêtres glissantes de window jours, tous les step jours
+
+    Retourne (indices de fin de fenêtre, tableau k × m × m).
+    """
+    n, m = returns.shape
+    ends = np.arange(window, n + 1, step)
+    if len(ends) == 0:
+        return ends, np.empty((0, m, m))
+
+    # Décalage par la moyenne globale : covariances inchangées, sommes mieux conditionnées
+    x = returns - returns.mean(axis=0)
+
+    # Sommes cumulées aux seules bornes des fenêtres, segment par segment
+    bounds = np.unique(np.concatenate([ends - window, ends]))
+    sums = np.zeros((len(bounds), m))
+    products = np.zeros((len(bounds), m, m))
+    for i in range(1, len(bounds)):
+        segment = x[bounds[i - 1]:bounds[i]]
+        sums[i] = segment.sum(axis=0)
+        products[i] = segment.T @ segment
+    np.cumsum(sums, axis=0, out=sums)
+    np.cumsum(products, axis=0, out=products)
+
+    hi = np.searchsorted(bounds, ends)
+    lo = np.searchsorted(bounds, ends - window)
+    total = sums[hi] - sums[lo]
+    covs = (products[hi] - products[lo] - total[:, :, None] * total[:, None, :] / window) \
+        / (window - 1)
+    return ends, covs
+
+
+def rolling_correlations(covs):
+    """Corrélations (k × m × m) déduites d'un empilement de covariances"""
+    std = np.sqrt(np.diagonal(covs, axis1=1, axis2=2))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corrs = covs / (std[:, :, None] * std[:, None, :])
+    idx = np.arange(covs.shape[1])
+    corrs[:, idx, idx] = 1.0
+    return corrs
+
+
+def matrix_to_lists(matrix):
+    """Matrice NumPy -> listes imbriquées JSON (NaN -> null)"""
+    return [
+        [None if not np.isfinite(v) else round(float(v), 8) for v in row]
+        for row in matrix
+    ]
+
+
+def correlation_report(panel, window=None, step=1):
+    """Matrices de covariance et de corrélation d'un PricePanel
+
+    Sans window : une matrice sur toute la période. Avec window : une
+    matrice par fenêtre glissante, tous les step jours ; ValueError au-delà
+    de MAX_WINDOWS fenêtres.
+    """
+    returns, tickers, rows = clean_returns(panel.returns(), panel.tickers)
+    dates = [d for d, keep in zip(panel.dates[1:], rows) if keep]
+
+    if window is None:
+        cov = covariance_matrix(returns)
+        return {
+            "tickers": tickers,
+            "start_date": dates[0] if dates else None,
+            "end_date": dates[-1] if dates else None,
+            "observations": len(dates),
+            "covariance": matrix_to_lists(cov),
+            "correlation": matrix_to_lists(correlation_from_covariance(cov)),
+        }
+
+    count = window_count(len(returns), window, step)
+    if count > MAX_WINDOWS:
+        raise ValueError(
+            f"Trop de fenêtres ({count} > {MAX_WINDOWS}) : augmenter step ou réduire days"
+        )
+
+    ends, covs = rolling_covariances(returns, window, step)
+    corrs = rolling_correlations(covs)
+    return {
+        "tickers": tickers,
+        "window": window,
+        "step": step,
+        "windows": [
+            {
+                "start_date": dates[end - window],
+                "end_date": dates[end - 1],
+                "covariance": matrix_to_lists(cov),
+                "correlation": matrix_to_lists(corr),
+            }
+            for end, cov, corr in zip(ends, covs, corrs)
+        ],
+    }
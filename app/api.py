@@ -1,10 +1,40 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from typing import List, Optional
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, desc, select
+from typing import Dict, List, Optional, Union
 from datetime import date, datetime, timedelta
+import pandas as pd
 from pydantic import BaseModel
-from database import get_db, Company, StockPrice
+from database import Company, StockPrice
+from async_database import get_async_db, AsyncSessionLocal, async_engine
+from cache import response_cache, TTLCache
+from rollup import rollups_are_current, rollup_statistics
+from snapshot import load_snapshot, latest_known_date, PERIODS
+from export import iter_record_batches, iter_arrow_stream, iter_parquet, MEDIA_TYPES
+from pagination import (
+    decode_cursor, next_page_headers, price_range_query, iter_ndjson,
+    rows_to_records, rows_to_columns, fetch_page
+)
+from panel import load_close_panel
+from indices import (
+    index_definitions, index_kind, index_is_current, latest_index_levels,
+    read_index_series, series_from_panel, load_custom_weights, BASE_LEVEL, CUSTOM_INDEX
+)
+from price_store import price_store, rows_from_columns, columns_payload, frame_from_columns
+from analytics import correlation_report
+from backtest import (
+    STRATEGIES, MAX_RUNS, MAX_VALUES, BACKTEST_PROCESSES,
+    grid_size, param_grid, backtest_report
+)
+import metrics
+from health import health_monitor, ping
+from registry import ticker_registry
+from indicators import (
+    parse_spec, compute_indicator, warmup_days, to_json_list, prices_frame
+)
 
 app = FastAPI(
     title="CAC 40 Data API",
@@ -13,6 +43,47 @@ app = FastAPI(
 )
 
 
+# Séries d'indicateurs déjà calculées, par (ticker, indicateur, paramètres,
+# période, version des données)
+indicator_cache = TTLCache()
+
+# Indices à poids fixes déclarés dans INDEX_WEIGHTS_FILE
+custom_index_weights = load_custom_weights()
+
+metrics.install(app, async_engine.sync_engine)
+metrics.register_cache("responses", response_cache)
+metrics.register_cache("indicators", indicator_cache)
+
+
+@app.on_event("startup")
+async def startup():
+    """Charge le référentiel des tickers et le premier résumé de santé,
+    puis lance le rafraîchissement en tâche de fond"""
+    async with AsyncSessionLocal() as db:
+        try:
+            await ticker_registry.ensure_current(db)
+        except Exception as e:
+            # Base indisponible : le registre se chargera à la première requête
+            print(f"⚠️  Référentiel des tickers non chargé: {str(e)}")
+    await health_monitor.refresh()
+    health_monitor.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Arrête les tâches de fond et ferme proprement le pool de connexions"""
+    await health_monitor.stop()
+    await async_engine.dispose()
+
+
+async def current_store(db):
+    """Store de prix mappé s'il reflète la version des données, sinon None"""
+    if not price_store.enabled:
+        return None
+    version = await response_cache.data_version(db)
+    return price_store if price_store.is_current(version) else None
+
+
 # Modèles Pydantic pour les réponses
 class CompanyResponse(BaseModel):
     ticker: str
@@ -36,6 +107,17 @@ class StockPriceResponse(BaseModel):
         from_attributes = True
 
 
+class StockPriceColumns(BaseModel):
+    """Réponse de /prices avec orient=columns : un tableau par colonne"""
+    ticker: str
+    date: List[date]
+    open: List[float]
+    high: List[float]
+    low: List[float]
+    close: List[float]
+    volume: List[float]
+
+
 class StockStatistics(BaseModel):
     ticker: str
     name: str
@@ -46,8 +128,50 @@ class StockStatistics(BaseModel):
     record_count: int
 
 
+class IndicatorsResponse(BaseModel):
+    ticker: str
+    dates: List[date]
+    indicators: Dict[str, List[Optional[float]]]
+
+
+class ComparisonResponse(BaseModel):
+    period_days: int
+    limit: Optional[int] = None
+    dates: List[date]
+    series: Dict[str, List[Optional[float]]]
+
+
+class IndexSeriesResponse(BaseModel):
+    name: str
+    dates: List[date]
+    levels: List[float]
+    constituents: List[int]
+
+
+class SnapshotEntry(BaseModel):
+    ticker: str
+    name: str
+    sector: str
+    date: date
+    open: Optional[float]
+    high: Optional[float]
+    low: Optional[float]
+    close: Optional[float]
+    volume: Optional[float]
+    prev_close: Optional[float]
+    change_pct: Optional[float]
+    # Variations en % : 1w, 1m, 3m, ytd, 1y
+    changes: Dict[str, Optional[float]]
+
+
+class SnapshotResponse(BaseModel):
+    date: Optional[date]
+    count: int
+    tickers: List[SnapshotEntry]
+
+
 @app.get("/")
-def root():
+async def root():
     """Point d'entrée de l'API"""
     return {
         "message": "Bienvenue sur l'API CAC 40 Data",
@@ -56,176 +180,780 @@ def root():
             "companies": "/companies",
             "prices": "/prices/{ticker}",
             "latest": "/latest/{ticker}",
+            "snapshot": "/snapshot",
             "statistics": "/statistics/{ticker}",
             "sectors": "/sectors",
-            "top_performers": "/top-performers"
+            "top_performers": "/top-performers",
+            "compare": "/compare",
+            "indices": "/indices",
+            "indicators": "/indicators/{ticker}",
+            "correlation": "/correlation",
+            "backtest": "/backtest?strategy=ma_crossover&fast=10&fast=20&slow=100&cost_bps=10",
+            "export": "/export",
+            "metrics": "/metrics",
+            "health": "/health",
+            "liveness": "/health/live"
         }
     }
 
 
 @app.get("/companies", response_model=List[CompanyResponse])
-def get_companies(
+async def get_companies(
+    request: Request,
     sector: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Récupère la liste des entreprises du CAC 40"""
-    query = db.query(Company)
+    async def compute():
+        return await ticker_registry.companies(db, sector)
     
-    if sector:
-        query = query.filter(Company.sector == sector)
-    
-    companies = query.all()
-    return companies
+    return await response_cache.respond(
+        request, db, "companies", {"sector": sector}, compute
+    )
 
 
 @app.get("/sectors")
-def get_sectors(db: Session = Depends(get_db)):
+async def get_sectors(request: Request, db: AsyncSession = Depends(get_async_db)):
     """Récupère la liste des secteurs"""
-    sectors = db.query(Company.sector).distinct().all()
-    return {"sectors": [s[0] for s in sectors]}
+    async def compute():
+        return {"sectors": await ticker_registry.sectors(db)}
+    
+    return await response_cache.respond(request, db, "sectors", {}, compute)
 
 
-@app.get("/prices/{ticker}", response_model=List[StockPriceResponse])
-def get_prices(
+@app.get("/prices/{ticker}", response_model=Union[List[StockPriceResponse], StockPriceColumns])
+async def get_prices(
+    request: Request,
     ticker: str,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    limit: int = Query(100, le=1000),
-    db: Session = Depends(get_db)
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="Curseur X-Next-Cursor de la page précédente"),
+    stream: bool = Query(False, description="Flux NDJSON de toute la période (sans limite)"),
+    orient: str = Query(
+        "records", pattern="^(records|columns)$",
+        description="records : une ligne par jour ; columns : un tableau par colonne"
+    ),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Récupère les prix historiques pour un ticker"""
-    # Vérifier que l'entreprise existe
-    company = db.query(Company).filter(Company.ticker == ticker).first()
-    if not company:
-        raise HTTPException(status_code=404, detail="Ticker non trouvé")
+    """Récupère les prix historiques pour un ticker
+
+    La page suivante s'obtient avec le curseur renvoyé dans l'en-tête
+    X-Next-Cursor (ou le lien Link rel="next"). Avec orient=columns, la
+    réponse est un objet {"ticker", "date": [...], "open": [...], ...}.
+    """
+    before = decode_cursor(cursor, ticker) if cursor else None
+    query = price_range_query(ticker, start_date, end_date, before)
+    
+    if stream:
+        await ticker_registry.require(db, ticker)
+        return StreamingResponse(iter_ndjson(query), media_type="application/x-ndjson")
     
-    query = db.query(StockPrice).filter(StockPrice.ticker == ticker)
+    async def compute():
+        # Vérifier que l'entreprise existe
+        await ticker_registry.require(db, ticker)
+        
+        # Colonnes typées : pas de validation ligne à ligne par le modèle,
+        # sérialisation directe des dicts/listes
+        store = await current_store(db)
+        if store is not None:
+            columns = store.columns(ticker, start_date, end_date, before)
+            if orient == "columns":
+                return columns_payload(ticker, columns, limit)
+            return rows_from_columns(ticker, columns, limit)
+        
+        if start_date is None:
+            anchors = [d for d in (before, end_date, await latest_known_date(db, ticker)) if d]
+            rows = await fetch_page(db, query, limit, min(anchors) if anchors else None)
+        else:
+            rows = (await db.execute(query.limit(limit))).all()
+        if orient == "columns":
+            return rows_to_columns(ticker, rows)
+        return rows_to_records(rows)
     
-    if start_date:
-        query = query.filter(StockPrice.date >= start_date)
-    if end_date:
-        query = query.filter(StockPrice.date <= end_date)
+    def page_dates(data):
+        return data["date"] if orient == "columns" else [row["date"] for row in data]
     
-    prices = query.order_by(desc(StockPrice.date)).limit(limit).all()
-    return prices
+    return await response_cache.respond(
+        request, db, "prices",
+        {
+            "ticker": ticker, "start_date": start_date, "end_date": end_date,
+            "limit": limit, "cursor": before, "orient": orient
+        },
+        compute,
+        headers_for=lambda data: next_page_headers(request, ticker, page_dates(data), limit)
+    )
 
 
 @app.get("/latest/{ticker}", response_model=StockPriceResponse)
-def get_latest_price(ticker: str, db: Session = Depends(get_db)):
+async def get_latest_price(
+    request: Request,
+    ticker: str,
+    db: AsyncSession = Depends(get_async_db)
+):
     """Récupère le dernier prix disponible pour un ticker"""
-    company = db.query(Company).filter(Company.ticker == ticker).first()
-    if not company:
-        raise HTTPException(status_code=404, detail="Ticker non trouvé")
-    
-    latest = db.query(StockPrice)\
-        .filter(StockPrice.ticker == ticker)\
-        .order_by(desc(StockPrice.date))\
-        .first()
+    async def compute():
+        await ticker_registry.require(db, ticker)
+        
+        store = await current_store(db)
+        if store is not None:
+            rows = rows_from_columns(ticker, store.columns(ticker), limit=1)
+            latest = rows[0] if rows else None
+        else:
+            query = select(StockPrice)\
+                .where(StockPrice.ticker == ticker)\
+                .order_by(desc(StockPrice.date))\
+                .limit(1)
+            # Borne basse tirée de latest_prices : seule la dernière
+            # partition est lue ; sans résultat, requête non bornée
+            latest = None
+            floor = await latest_known_date(db, ticker)
+            if floor is not None:
+                latest = (await db.execute(
+                    query.where(StockPrice.date >= floor)
+                )).scalars().first()
+            if latest is None:
+                latest = (await db.execute(query)).scalars().first()
+        
+        if not latest:
+            raise HTTPException(status_code=404, detail="Aucune donnée disponible")
+        
+        return StockPriceResponse.model_validate(latest)
     
-    if not latest:
-        raise HTTPException(status_code=404, detail="Aucune donnée disponible")
+    return await response_cache.respond(request, db, "latest", {"ticker": ticker}, compute)
+
+
+def round_change(value):
+    return round(float(value), 2) if value is not None else None
+
+
+@app.get("/snapshot", response_model=SnapshotResponse)
+async def get_snapshot(
+    request: Request,
+    sector: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Dernier cours, variation du jour et variations par période de tous
+    les tickers, en une réponse"""
+    async def compute():
+        companies = {
+            company["ticker"]: company
+            for company in await ticker_registry.companies(db, sector)
+        }
+        entries = [
+            {
+                **companies[row["ticker"]],
+                "date": row["date"],
+                "open": row["open"],
+                "high": row["high"],
+                "low": row["low"],
+                "close": row["close"],
+                "volume": row["volume"],
+                "prev_close": row["prev_close"],
+                "change_pct": round_change(row["change_1d"]),
+                "changes": {
+                    column.removeprefix("change_"): round_change(row[column])
+                    for column in PERIODS if column != "change_1d"
+                }
+            }
+            for row in await load_snapshot(db)
+            if row["ticker"] in companies
+        ]
+        return {
+            "date": max((entry["date"] for entry in entries), default=None),
+            "count": len(entries),
+            "tickers": entries
+        }
     
-    return latest
+    return await response_cache.respond(request, db, "snapshot", {"sector": sector}, compute)
 
 
 @app.get("/statistics/{ticker}", response_model=StockStatistics)
-def get_statistics(
+async def get_statistics(
+    request: Request,
     ticker: str,
     days: int = Query(30, ge=1, le=365),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Récupère des statistiques pour un ticker sur une période donnée"""
-    company = db.query(Company).filter(Company.ticker == ticker).first()
-    if not company:
-        raise HTTPException(status_code=404, detail="Ticker non trouvé")
-    
-    cutoff_date = datetime.now().date() - timedelta(days=days)
-    
-    stats = db.query(
-        func.avg(StockPrice.close).label('avg_close'),
-        func.min(StockPrice.close).label('min_close'),
-        func.max(StockPrice.close).label('max_close'),
-        func.sum(StockPrice.volume).label('total_volume'),
-        func.count(StockPrice.id).label('record_count')
-    ).filter(
-        StockPrice.ticker == ticker,
-        StockPrice.date >= cutoff_date
-    ).first()
+    today = datetime.now().date()
     
-    return {
-        "ticker": ticker,
-        "name": company.name,
-        "avg_close": float(stats.avg_close) if stats.avg_close else 0,
-        "min_close": float(stats.min_close) if stats.min_close else 0,
-        "max_close": float(stats.max_close) if stats.max_close else 0,
-        "total_volume": float(stats.total_volume) if stats.total_volume else 0,
-        "record_count": int(stats.record_count) if stats.record_count else 0
-    }
+    async def compute():
+        company = await ticker_registry.require(db, ticker)
+        
+        cutoff_date = today - timedelta(days=days)
+        
+        # Agrégats précalculés si le chargeur les a mis à jour, sinon
+        # calcul direct sur stock_prices
+        if await rollups_are_current(db):
+            stats = await rollup_statistics(db, ticker, cutoff_date)
+            return {"ticker": ticker, "name": company["name"], **stats}
+        
+        result = await db.execute(
+            select(
+                func.avg(StockPrice.close).label('avg_close'),
+                func.min(StockPrice.close).label('min_close'),
+                func.max(StockPrice.close).label('max_close'),
+                func.sum(StockPrice.volume).label('total_volume'),
+                func.count().label('record_count')
+            ).where(
+                StockPrice.ticker == ticker,
+                StockPrice.date >= cutoff_date
+            )
+        )
+        stats = result.first()
+        
+        return {
+            "ticker": ticker,
+            "name": company["name"],
+            "avg_close": float(stats.avg_close) if stats.avg_close else 0,
+            "min_close": float(stats.min_close) if stats.min_close else 0,
+            "max_close": float(stats.max_close) if stats.max_close else 0,
+            "total_volume": float(stats.total_volume) if stats.total_volume else 0,
+            "record_count": int(stats.record_count) if stats.record_count else 0
+        }
+    
+    # La fenêtre est relative à aujourd'hui : la date fait partie de la clé
+    return await response_cache.respond(
+        request, db, "statistics",
+        {"ticker": ticker, "days": days, "today": today},
+        compute
+    )
 
 
 @app.get("/top-performers")
-def get_top_performers(
+async def get_top_performers(
+    request: Request,
     days: int = Query(30, ge=1, le=365),
     limit: int = Query(10, ge=1, le=40),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Récupère les meilleures performances sur une période"""
-    cutoff_date = datetime.now().date() - timedelta(days=days)
-    
-    # Récupérer toutes les entreprises
-    companies = db.query(Company).all()
-    performances = []
-    
-    for company in companies:
-        # Prix au début de la période
-        start_price = db.query(StockPrice.close)\
-            .filter(StockPrice.ticker == company.ticker)\
-            .filter(StockPrice.date >= cutoff_date)\
-            .order_by(StockPrice.date)\
-            .first()
-        
-        # Prix le plus récent
-        end_price = db.query(StockPrice.close)\
-            .filter(StockPrice.ticker == company.ticker)\
-            .order_by(desc(StockPrice.date))\
-            .first()
-        
-        if start_price and end_price:
-            start_val = float(start_price[0])
-            end_val = float(end_price[0])
-            performance = ((end_val - start_val) / start_val) * 100
-            
-            performances.append({
-                "ticker": company.ticker,
-                "name": company.name,
-                "sector": company.sector,
-                "performance": round(performance, 2),
-                "start_price": round(start_val, 2),
-                "end_price": round(end_val, 2)
-            })
-    
-    # Trier par performance
-    performances.sort(key=lambda x: x['performance'], reverse=True)
+    today = datetime.now().date()
     
-    return {
-        "period_days": days,
-        "top_performers": performances[:limit]
-    }
+    async def compute():
+        cutoff_date = today - timedelta(days=days)
+        
+        # Premier et dernier cours de chaque ticker depuis la date de coupure,
+        # en une seule requête (DISTINCT ON sur l'index (ticker, date DESC))
+        first_prices = select(StockPrice.ticker, StockPrice.close)\
+            .where(StockPrice.date >= cutoff_date)\
+            .distinct(StockPrice.ticker)\
+            .order_by(StockPrice.ticker, StockPrice.date)\
+            .subquery()
+        
+        last_prices = select(StockPrice.ticker, StockPrice.close)\
+            .where(StockPrice.date >= cutoff_date)\
+            .distinct(StockPrice.ticker)\
+            .order_by(StockPrice.ticker, desc(StockPrice.date))\
+            .subquery()
+        
+        performance = (
+            (last_prices.c.close - first_prices.c.close) / first_prices.c.close * 100
+        ).label("performance")
+        
+        query = select(
+            Company.ticker,
+            Company.name,
+            Company.sector,
+            performance,
+            first_prices.c.close.label("start_price"),
+            last_prices.c.close.label("end_price")
+        )\
+            .join(first_prices, first_prices.c.ticker == Company.ticker)\
+            .join(last_prices, last_prices.c.ticker == Company.ticker)\
+            .where(first_prices.c.close != 0)\
+            .order_by(desc(performance))\
+            .limit(limit)
+        rows = (await db.execute(query)).all()
+        
+        performances = [
+            {
+                "ticker": row.ticker,
+                "name": row.name,
+                "sector": row.sector,
+                "performance": round(float(row.performance), 2),
+                "start_price": round(float(row.start_price), 2),
+                "end_price": round(float(row.end_price), 2)
+            }
+            for row in rows
+        ]
+        
+        return {
+            "period_days": days,
+            "top_performers": performances
+        }
+    
+    return await response_cache.respond(
+        request, db, "top-performers",
+        {"days": days, "limit": limit, "today": today},
+        compute
+    )
 
 
-@app.get("/health")
-def health_check(db: Session = Depends(get_db)):
-    """Vérifie la santé de l'API et de la base de données"""
+@app.get("/indicators/{ticker}", response_model=IndicatorsResponse)
+async def get_indicators(
+    request: Request,
+    ticker: str,
+    indicators: List[str] = Query(
+        ["sma:20"],
+        description="sma, ema, returns, volatility, rsi, bollinger, drawdown "
+                    "(fenêtre optionnelle : sma:50)"
+    ),
+    days: int = Query(365, ge=1, le=3650),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Calcule des indicateurs techniques sur une période
+
+    Les indicateurs demandés ensemble partagent un seul chargement des prix.
+    """
     try:
-        # Test de connexion à la DB
-        company_count = db.query(Company).count()
-        price_count = db.query(StockPrice).count()
+        specs = sorted({parse_spec(spec) for spec in indicators})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    today = datetime.now().date()
+    cutoff_date = today - timedelta(days=days)
+    
+    async def compute():
+        await ticker_registry.require(db, ticker)
+        version = await response_cache.data_version(db)
+        
+        results = {}
+        missing = []
+        for spec in specs:
+            cached = indicator_cache.get((ticker, spec, cutoff_date, version))
+            if cached is None:
+                missing.append(spec)
+            else:
+                results[spec] = cached
+        
+        if missing:
+            load_from = cutoff_date - timedelta(days=warmup_days(missing))
+            store = await current_store(db)
+            if store is not None:
+                prices = frame_from_columns(store.columns(ticker, load_from))
+            else:
+                rows = (await db.execute(
+                    select(
+                        StockPrice.date, StockPrice.open, StockPrice.high,
+                        StockPrice.low, StockPrice.close, StockPrice.volume
+                    ).where(
+                        StockPrice.ticker == ticker,
+                        StockPrice.date >= load_from
+                    ).order_by(StockPrice.date)
+                )).all()
+                prices = prices_frame(rows)
+            
+            for spec in missing:
+                # Historique propre à chaque indicateur : le résultat ne dépend
+                # pas des autres indicateurs demandés dans la même requête
+                start = cutoff_date - timedelta(days=warmup_days([spec]))
+                series = compute_indicator(prices[prices.index >= start], *spec)
+                
+                in_period = prices.index[prices.index >= cutoff_date]
+                value = (
+                    list(in_period),
+                    {name: to_json_list(s.reindex(in_period)) for name, s in series.items()}
+                )
+                indicator_cache.set((ticker, spec, cutoff_date, version), value)
+                results[spec] = value
+        
+        dates = results[specs[0]][0] if specs else []
+        merged = {}
+        for spec in specs:
+            merged.update(results[spec][1])
+        
+        return {"ticker": ticker, "dates": dates, "indicators": merged}
+    
+    return await response_cache.respond(
+        request, db, "indicators",
+        {"ticker": ticker, "indicators": specs, "days": days, "today": today},
+        compute
+    )
+
+
+@app.get("/compare", response_model=ComparisonResponse)
+async def compare_prices(
+    request: Request,
+    tickers: List[str] = Query(..., max_length=40),
+    days: int = Query(90, ge=1, le=3650),
+    limit: Optional[int] = Query(
+        None, ge=1, le=1000, description="Dernières cotations par ticker (remplace days)"
+    ),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Séries de clôture de plusieurs tickers, rebasées à 100 au début de la
+    période et alignées sur un axe de dates commun
+
+    La période est celle des days derniers jours calendaires, ou, avec
+    limit, celle des limit dernières cotations de chaque ticker.
+    """
+    tickers = sorted(set(tickers))
+    today = datetime.now().date()
+    
+    async def compute():
+        unknown = await ticker_registry.unknown(db, tickers)
+        if unknown:
+            raise HTTPException(
+                status_code=404, detail=f"Ticker non trouvé: {', '.join(unknown)}"
+            )
+        
+        recent = select(StockPrice.date, StockPrice.ticker, StockPrice.close)\
+            .where(StockPrice.ticker.in_(tickers))
+        if limit is None:
+            recent = recent.where(StockPrice.date >= today - timedelta(days=days))
+        else:
+            # Les limit dernières cotations de chaque ticker
+            rank = func.row_number().over(
+                partition_by=StockPrice.ticker, order_by=desc(StockPrice.date)
+            )
+            ranked = recent.add_columns(rank.label("rank")).subquery()
+            recent = select(ranked.c.date, ranked.c.ticker, ranked.c.close)\
+                .where(ranked.c.rank <= limit)
+        recent = recent.subquery()
+        
+        # Rebasage à 100 sur la première clôture de chaque ticker, en SQL
+        first_close = func.first_value(recent.c.close).over(
+            partition_by=recent.c.ticker, order_by=recent.c.date
+        )
+        rebased = (recent.c.close / func.nullif(first_close, 0) * 100).label("rebased")
+        rows = (await db.execute(
+            select(recent.c.date, recent.c.ticker, rebased)
+        )).all()
+        
+        if not rows:
+            return {
+                "period_days": days, "limit": limit,
+                "dates": [], "series": {t: [] for t in tickers}
+            }
+        
+        # Alignement sur l'union des dates (null si pas de cotation ce jour-là)
+        panel = pd.DataFrame(rows, columns=["date", "ticker", "rebased"])\
+            .pivot(index="date", columns="ticker", values="rebased")\
+            .reindex(columns=tickers)\
+            .sort_index()\
+            .round(4)
+        panel = panel.astype(object).where(panel.notna(), None)
         
         return {
-            "status": "healthy",
-            "database": "connected",
-            "companies": company_count,
-            "price_records": price_count
+            "period_days": days,
+            "limit": limit,
+            "dates": list(panel.index),
+            "series": {t: panel[t].tolist() for t in tickers}
         }
+    
+    return await response_cache.respond(
+        request, db, "compare",
+        {"tickers": ",".join(tickers), "days": days, "limit": limit, "today": today},
+        compute
+    )
+
+
+async def persisted_index_definitions(db):
+    """Indices persistés : équipondéré, secteurs et INDEX_WEIGHTS_FILE"""
+    companies = await ticker_registry.companies(db)
+    return index_definitions(
+        ((company["ticker"], company["sector"]) for company in companies),
+        custom_index_weights
+    )
+
+
+async def live_index_series(db, definitions):
+    """Séries calculées sur tout l'historique, quand index_levels est en retard"""
+    tickers = sorted({ticker for weights in definitions.values() for ticker in weights})
+    panel = await load_close_panel(db, tickers, store=await current_store(db))
+    return await run_in_threadpool(series_from_panel, panel, definitions)
+
+
+def parse_weights(values):
+    """["MC.PA:2", "OR.PA"] -> {"MC.PA": 2.0, "OR.PA": 1.0}"""
+    weights = {}
+    for value in values:
+        ticker, _, weight = value.partition(":")
+        try:
+            weight = float(weight) if weight else 1.0
+        except ValueError:
+            weight = 0.0
+        if not ticker or not 0 < weight < float("inf"):
+            raise HTTPException(status_code=422, detail=f"Poids invalide: {value}")
+        weights[ticker] = weight
+    return weights
+
+
+@app.get("/indices")
+async def get_indices(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Indices reconstitués disponibles et leur dernier niveau"""
+    async def compute():
+        definitions = await persisted_index_definitions(db)
+        if await index_is_current(db):
+            latest = {
+                row.name: (row.date, round(row.level, 4), row.constituents)
+                for row in await latest_index_levels(db)
+            }
+        else:
+            latest = {
+                name: (series["dates"][-1], series["levels"][-1], series["constituents"][-1])
+                for name, series in (await live_index_series(db, definitions)).items()
+                if series["dates"]
+            }
+        
+        return {
+            "base_level": BASE_LEVEL,
+            "indices": [
+                {
+                    "name": name,
+                    "kind": index_kind(name),
+                    "tickers": len(weights),
+                    "date": latest[name][0],
+                    "level": latest[name][1],
+                    "constituents": latest[name][2]
+                }
+                for name, weights in definitions.items()
+                if name in latest
+            ]
+        }
+    
+    return await response_cache.respond(request, db, "indices", {}, compute)
+
+
+@app.get("/indices/custom", response_model=IndexSeriesResponse)
+async def get_custom_index(
+    request: Request,
+    weights: List[str] = Query(..., max_length=40, description="TICKER:poids (poids 1 par défaut)"),
+    days: int = Query(365, ge=5, le=3650),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Indice à poids fixes calculé à la volée, base 1000 au début de la période"""
+    definition = parse_weights(weights)
+    today = datetime.now().date()
+    
+    async def compute():
+        unknown = await ticker_registry.unknown(db, definition)
+        if unknown:
+            raise HTTPException(
+                status_code=404, detail=f"Ticker non trouvé: {', '.join(unknown)}"
+            )
+        
+        panel = await load_close_panel(
+            db, sorted(definition), start_date=today - timedelta(days=days),
+            store=await current_store(db)
+        )
+        series = await run_in_threadpool(series_from_panel, panel, {CUSTOM_INDEX: definition})
+        return {"name": CUSTOM_INDEX, **series[CUSTOM_INDEX]}
+    
+    return await response_cache.respond(
+        request, db, "custom-index",
+        {
+            "weights": ",".join(f"{t}:{w}" for t, w in sorted(definition.items())),
+            "days": days, "today": today
+        },
+        compute
+    )
+
+
+@app.get("/indices/{name}", response_model=IndexSeriesResponse)
+async def get_index(
+    request: Request,
+    name: str,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Série d'un indice reconstitué (equal_weight, sector:<secteur> ou
+    indice configuré), lue en une requête dans index_levels"""
+    async def compute():
+        definitions = await persisted_index_definitions(db)
+        if name not in definitions:
+            raise HTTPException(status_code=404, detail="Indice non trouvé")
+        
+        if await index_is_current(db):
+            series = await read_index_series(db, name, start_date, end_date)
+        else:
+            series = (await live_index_series(db, {name: definitions[name]}))[name]
+            keep = [
+                (start_date is None or d >= start_date) and (end_date is None or d <= end_date)
+                for d in series["dates"]
+            ]
+            series = {
+                key: [value for value, k in zip(values, keep) if k]
+                for key, values in series.items()
+            }
+        return {"name": name, **series}
+    
+    return await response_cache.respond(
+        request, db, "index",
+        {"name": name, "start_date": start_date, "end_date": end_date},
+        compute
+    )
+
+
+@app.get("/correlation")
+async def get_correlation(
+    request: Request,
+    days: int = Query(365, ge=5, le=3650),
+    window: Optional[int] = Query(None, ge=5, le=1000, description="Fenêtre glissante (jours de bourse)"),
+    step: int = Query(20, ge=1, le=1000, description="Pas entre deux fenêtres glissantes"),
+    tickers: Optional[List[str]] = Query(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Matrices de covariance et de corrélation des rendements quotidiens
+
+    Tous les tickers par défaut ; avec window, une matrice par fenêtre
+    glissante.
+    """
+    today = datetime.now().date()
+    tickers = sorted(set(tickers)) if tickers else None
+    
+    async def compute():
+        panel = await load_close_panel(
+            db, tickers, start_date=today - timedelta(days=days),
+            store=await current_store(db)
+        )
+        # Calcul NumPy hors de la boucle d'événements
+        try:
+            return await run_in_threadpool(correlation_report, panel, window, step)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    
+    return await response_cache.respond(
+        request, db, "correlation",
+        {
+            "days": days, "window": window, "step": step if window else None,
+            "tickers": ",".join(tickers) if tickers else None, "today": today
+        },
+        compute
+    )
+
+
+@app.get("/backtest")
+async def run_backtest(
+    request: Request,
+    strategy: str = Query("ma_crossover", pattern="^(ma_crossover|momentum)$"),
+    days: int = Query(1825, ge=30, le=7300),
+    tickers: Optional[List[str]] = Query(None),
+    fast: Optional[List[int]] = Query(
+        None, max_length=MAX_VALUES, description="MM courte (ma_crossover)"
+    ),
+    slow: Optional[List[int]] = Query(
+        None, max_length=MAX_VALUES, description="MM longue (ma_crossover)"
+    ),
+    lookback: Optional[List[int]] = Query(
+        None, max_length=MAX_VALUES, description="Période du momentum (jours de bourse)"
+    ),
+    top: Optional[List[int]] = Query(
+        None, max_length=MAX_VALUES, description="Tickers détenus (momentum)"
+    ),
+    rebalance: Optional[List[int]] = Query(
+        None, max_length=MAX_VALUES, description="Jours entre deux révisions des poids"
+    ),
+    cost_bps: Optional[List[float]] = Query(
+        None, max_length=MAX_VALUES, description="Frais en points de base de la rotation"
+    ),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Backtest vectorisé d'une stratégie sur les clôtures
+
+    Chaque paramètre accepte plusieurs valeurs : tous les jeux du produit
+    cartésien sont évalués en un balayage, triés par ratio de Sharpe, avec
+    la courbe de valeur du meilleur jeu.
+    """
+    values = {
+        "fast": fast, "slow": slow, "lookback": lookback, "top": top,
+        "rebalance": rebalance, "cost_bps": cost_bps
+    }
+    _, defaults = STRATEGIES[strategy]
+    ignored = [
+        name for name, v in values.items()
+        if v and name not in defaults and name != "cost_bps"
+    ]
+    if ignored:
+        raise HTTPException(
+            status_code=422, detail=f"Paramètres sans objet pour {strategy}: {', '.join(ignored)}"
+        )
+    
+    # Taille vérifiée avant de construire le produit cartésien
+    runs = grid_size(strategy, **values)
+    if runs > MAX_RUNS:
+        raise HTTPException(
+            status_code=422, detail=f"Trop de jeux de paramètres ({runs} > {MAX_RUNS})"
+        )
+    param_sets = param_grid(strategy, **values)
+    if not param_sets:
+        raise HTTPException(status_code=422, detail="Aucun jeu de paramètres valide")
+    
+    today = datetime.now().date()
+    tickers = sorted(set(tickers)) if tickers else None
+    
+    async def compute():
+        if tickers:
+            unknown = await ticker_registry.unknown(db, tickers)
+            if unknown:
+                raise HTTPException(
+                    status_code=404, detail=f"Ticker non trouvé: {', '.join(unknown)}"
+                )
+        
+        panel = await load_close_panel(
+            db, tickers, start_date=today - timedelta(days=days),
+            store=await current_store(db)
+        )
+        return await run_in_threadpool(
+            backtest_report, panel, strategy, param_sets, BACKTEST_PROCESSES
+        )
+    
+    return await response_cache.respond(
+        request, db, "backtest",
+        {
+            "strategy": strategy, "days": days,
+            "tickers": ",".join(tickers) if tickers else None, "today": today,
+            **{name: ",".join(map(str, sorted(v))) for name, v in values.items() if v}
+        },
+        compute
+    )
+
+
+@app.get("/export")
+async def export_prices(
+    tickers: Optional[List[str]] = Query(None),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    format: str = Query("arrow", pattern="^(arrow|parquet)$")
+):
+    """Exporte l'historique de un ou plusieurs tickers (tous par défaut)
+    au format Arrow IPC ou Parquet, en flux au fil du COPY"""
+    batches = iter_record_batches(tickers, start_date, end_date)
+    writer = iter_parquet if format == "parquet" else iter_arrow_stream
+    filename = f"cac40_prices.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    
+    return StreamingResponse(
+        writer(batches), media_type=MEDIA_TYPES[format], headers=headers
+    )
+
+
+@app.get("/health/live")
+async def liveness_check():
+    """Sonde de vivacité : SELECT 1 avec un délai court"""
+    try:
+        await ping()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erreur de santé: {str(e)}")
+        raise HTTPException(status_code=503, detail=f"Base injoignable: {str(e) or type(e).__name__}")
+    return {"status": "alive"}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Métriques de l'API au format texte Prometheus"""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/health")
+async def health_check():
+    """Disponibilité et statistiques de la base (résumé rafraîchi en tâche de fond)
+
+    Le nombre de prix est une estimation du catalogue PostgreSQL.
+    """
+    report = jsonable_encoder(health_monitor.report())
+    if not health_monitor.ready:
+        return JSONResponse(status_code=503, content=report)
+    return report
@@ -0,0 +1,73 @@
+"""
+Moteur SQLAlchemy asynchrone (asyncpg) utilisé par l'API.
+
+Il lit la même DATABASE_URL et les mêmes réglages de pool que
+database.py ; le chargeur continue d'utiliser le moteur synchrone.
+"""
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from database import (
+    DATABASE_URL, POOL_OPTIONS, DataVersion, versions_query, versions_from_rows
+)
+
+# Paramètres libpq que asyncpg ne comprend pas dans l'URL
+LIBPQ_ONLY_PARAMS = ("sslmode", "channel_binding")
+
+
+def to_async_url(database_url):
+    """Convertit une URL psycopg2 en URL asyncpg + connect_args
+
+    sslmode est transmis à asyncpg via l'argument ssl ; channel_binding est
+    négocié automatiquement par asyncpg.
+    """
+    url = make_url(database_url)
+    connect_args = {}
+
+    sslmode = url.query.get("sslmode")
+    if sslmode:
+        connect_args["ssl"] = sslmode
+
+    # Derrière un pooler PgBouncer (Neon "-pooler"), pas de cache de
+    # requêtes préparées : chaque transaction peut changer de connexion
+    if url.host and "-pooler" in url.host:
+        connect_args["statement_cache_size"] = 0
+        url = url.update_query_dict({"prepared_statement_cache_size": "0"})
+
+    url = url.difference_update_query(LIBPQ_ONLY_PARAMS)
+    url = url.set(drivername="postgresql+asyncpg")
+    return url, connect_args
+
+
+ASYNC_DATABASE_URL, ASYNC_CONNECT_ARGS = to_async_url(DATABASE_URL)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    connect_args=ASYNC_CONNECT_ARGS,
+    **POOL_OPTIONS
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+
+async def get_async_db():
+    """Dépendance pour obtenir une session asynchrone"""
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+async def get_data_version_async(db, name="prices"):
+    """Équivalent asynchrone de database.get_data_version"""
+    result = await db.execute(
+        select(DataVersion.version).where(DataVersion.name == name)
+    )
+    return result.scalar() or 0
+
+
+async def versions_match_async(db, name, source="prices"):
+    """Équivalent asynchrone de database.versions_match"""
+    result = await db.execute(versions_query(name, source))
+    return versions_from_rows(result.all(), name, source)
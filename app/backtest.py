@@ -0,0 +1,345 @@
+"""
+Backtests vectorisés sur le panel des clôtures.
+
+Le panel (jours × tickers) est chargé une fois ; une stratégie produit,
+pour un lot de k jeux de paramètres, des poids cibles (k × jours ×
+tickers) décidés à la clôture, appliqués au rendement du jour suivant.
+Signaux, positions, rotation, frais et performances sont calculés pour
+tous les tickers et tous les jeux du lot par des opérations NumPy, sans
+boucle sur les jours.
+
+- ma_crossover : position longue (1/m du capital par ticker) tant que la
+  moyenne mobile courte est au-dessus de la longue ;
+- momentum : les top tickers au meilleur rendement sur lookback jours,
+  à poids égaux.
+
+Les poids cibles ne sont révisés que tous les rebalance jours. Les frais
+(cost_bps, en points de base) s'appliquent à la rotation : la somme des
+variations absolues de poids. Un balayage (sweep) est le produit cartésien
+des valeurs de paramètres ; il est découpé en lots de taille bornée,
+évalués au besoin dans un pool de processus :
+
+    python backtest.py --strategy momentum --lookback 20 60 120 --top 3 5 10 --processes 4
+"""
+import argparse
+import itertools
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from database import SessionLocal
+from panel import load_close_panel_sync
+
+TRADING_DAYS = 252
+
+# Cellules (jeux × jours × tickers) par lot : borne la mémoire d'un lot
+BATCH_CELLS = 4_000_000
+
+# Jeux de paramètres au plus par balayage, et valeurs au plus par paramètre
+MAX_RUNS = 1000
+MAX_VALUES = 50
+
+# Processus du pool de l'API (1 : calcul dans le processus de l'API)
+BACKTEST_PROCESSES = int(os.getenv("BACKTEST_PROCESSES", "1"))
+
+
+def forward_fill(values):
+    """Remplace chaque NaN par la dernière valeur connue de la colonne"""
+    n = values.shape[0]
+    index = np.where(np.isfinite(values), np.arange(n)[:, None], 0)
+    np.maximum.accumulate(index, axis=0, out=index)
+    # Avant la première cotation, les lignes pointent sur la ligne 0 : NaN conservé
+    return np.take_along_axis(values, index, axis=0)
+
+
+def moving_averages(prices, windows):
+    """Moyennes mobiles (len(windows) × n × m) par sommes cumulées
+
+    NaN tant que la fenêtre n'est pas entièrement cotée.
+    """
+    n, m = prices.shape
+    valid = np.isfinite(prices)
+    sums = np.zeros((n + 1, m))
+    np.cumsum(np.where(valid, prices, 0.0), axis=0, out=sums[1:])
+    counts = np.zeros((n + 1, m))
+    np.cumsum(valid, axis=0, out=counts[1:])
+
+    averages = np.full((len(windows), n, m), np.nan)
+    for i, window in enumerate(windows):
+        if window > n:
+            continue
+        total = sums[window:] - sums[:-window]
+        full = counts[window:] - counts[:-window] == window
+        averages[i, window - 1:] = np.where(full, total / window, np.nan)
+    return averages
+
+
+def trailing_returns(prices, lookbacks):
+    """Rendements sur lookback jours (len(lookbacks) × n × m), NaN au début"""
+    n, m = prices.shape
+    result = np.full((len(lookbacks), n, m), np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for i, lookback in enumerate(lookbacks):
+            if lookback < n:
+                result[i, lookback:] = prices[lookback:] / prices[:-lookback] - 1
+    return result
+
+
+def lookup(values, unique):
+    """Position de chaque valeur dans unique (trié)"""
+    return np.searchsorted(unique, values)
+
+
+def ma_crossover_weights(prices, params):
+    """Poids (k × n × m) : 1/m par ticker dont la MM courte dépasse la longue"""
+    fast, slow = params["fast"], params["slow"]
+    windows = np.unique(np.concatenate([fast, slow]))
+    averages = moving_averages(prices, windows)
+
+    with np.errstate(invalid="ignore"):
+        signal = averages[lookup(fast, windows)] > averages[lookup(slow, windows)]
+    return signal / prices.shape[1]
+
+
+def momentum_weights(prices, params):
+    """Poids (k × n × m) : 1/top sur les top meilleurs rendements passés"""
+    lookback, top = params["lookback"], params["top"]
+    lookbacks = np.unique(lookback)
+    scores = trailing_returns(prices, lookbacks)
+    scores[~np.isfinite(scores)] = -np.inf
+
+    # Un tri par période : le seuil d'un jeu est son top-ième meilleur score
+    ranked = -np.sort(-scores, axis=2)
+    m = prices.shape[1]
+    thresholds = ranked[lookup(lookback, lookbacks), :, np.minimum(top, m) - 1]
+    scores = scores[lookup(lookback, lookbacks)]
+    selected = (scores >= thresholds[:, :, None]) & (scores > -np.inf)
+    return selected / top[:, None, None]
+
+
+# stratégie -> (fonction des poids, valeurs par défaut des paramètres)
+STRATEGIES = {
+    "ma_crossover": (ma_crossover_weights, {"fast": [20], "slow": [50], "rebalance": [1]}),
+    "momentum": (momentum_weights, {"lookback": [60], "top": [5], "rebalance": [20]}),
+}
+
+DEFAULT_COST_BPS = 10.0
+
+
+def param_choices(strategy, **values):
+    """(noms, valeurs distinctes de chaque paramètre), défauts compris"""
+    _, defaults = STRATEGIES[strategy]
+    names = list(defaults) + ["cost_bps"]
+    choices = [
+        sorted(set(values.get(name) or defaults.get(name, [DEFAULT_COST_BPS])))
+        for name in names
+    ]
+    return names, choices
+
+
+def grid_size(strategy, **values):
+    """Taille du produit cartésien, calculée sans le construire"""
+    _, choices = param_choices(strategy, **values)
+    return math.prod(len(c) for c in choices)
+
+
+def param_grid(strategy, **values):
+    """Produit cartésien des valeurs de paramètres -> [{paramètre: valeur}]
+
+    Les paramètres absents prennent leur valeur par défaut ; les jeux sans
+    objet (MM courte plus longue que la longue, top < 1...) sont écartés.
+    Vérifier grid_size avant d'appeler sur des valeurs non bornées.
+    """
+    names, choices = param_choices(strategy, **values)
+
+    grid = []
+    for combination in itertools.product(*choices):
+        params = dict(zip(names, combination))
+        if min(v for k, v in params.items() if k != "cost_bps") < 1 or params["cost_bps"] < 0:
+            continue
+        if strategy == "ma_crossover" and params["fast"] >= params["slow"]:
+            continue
+        grid.append(params)
+    return grid
+
+
+def rebalance_weights(weights, periods):
+    """Garde les poids cibles du dernier jour de révision (tous les periods jours)"""
+    n = weights.shape[1]
+    last = (np.arange(n)[None, :] // periods[:, None]) * periods[:, None]
+    return np.take_along_axis(weights, last[:, :, None], axis=1)
+
+
+def simulate(prices, weights, cost_bps):
+    """Rendements nets (k × n - 1) et rotation quotidienne (k × n - 1)
+
+    Les poids décidés à la clôture du jour t portent sur le rendement de
+    t à t + 1 ; la rotation de t est payée sur ce même rendement.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = prices[1:] / prices[:-1] - 1
+    returns = np.where(np.isfinite(returns), returns, 0.0)
+
+    held = weights[:, :-1]
+    gross = np.einsum("knm,nm->kn", held, returns)
+    turnover = np.abs(np.diff(held, axis=1, prepend=0.0)).sum(axis=2)
+    return gross - turnover * cost_bps[:, None] / 10_000, turnover
+
+
+def performance(net, turnover):
+    """Indicateurs annualisés par jeu de paramètres : {nom: tableau (k)}
+
+    net et turnover couvrent au moins un jour.
+    """
+    k, n = net.shape
+    equity = np.cumprod(1 + net, axis=1)
+    final = equity[:, -1]
+    peaks = np.maximum.accumulate(np.maximum(equity, 1.0), axis=1)
+
+    volatility = np.full(k, np.nan)
+    if n > 1:
+        volatility = net.std(axis=1, ddof=1) * np.sqrt(TRADING_DAYS)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(volatility > 0, net.mean(axis=1) * TRADING_DAYS / volatility, np.nan)
+
+    return {
+        "total_return": final - 1,
+        "cagr": final ** (TRADING_DAYS / n) - 1,
+        "volatility": volatility,
+        "sharpe": sharpe,
+        "max_drawdown": (equity / peaks - 1).min(axis=1),
+        "turnover": turnover.mean(axis=1) * TRADING_DAYS,
+    }
+
+
+def run_batch(prices, strategy, param_sets):
+    """Évalue un lot de jeux de paramètres : {indicateur: tableau (k)}"""
+    weights_fn, defaults = STRATEGIES[strategy]
+    params = {
+        name: np.array([p[name] for p in param_sets])
+        for name in list(defaults) + ["cost_bps"]
+    }
+    weights = rebalance_weights(weights_fn(prices, params), params["rebalance"])
+    net, turnover = simulate(prices, weights, params["cost_bps"].astype(np.float64))
+    return performance(net, turnover)
+
+
+def batches(param_sets, prices, processes=1):
+    """Découpe les jeux de paramètres en lots d'au plus BATCH_CELLS cellules"""
+    size = max(1, BATCH_CELLS // max(1, prices.size))
+    if processes > 1:
+        size = min(size, -(-len(param_sets) // processes))
+    return [param_sets[i:i + size] for i in range(0, len(param_sets), size)]
+
+
+def sweep(panel, strategy, param_sets, processes=1):
+    """Évalue tous les jeux de paramètres sur le panel
+
+    Retourne une liste alignée sur param_sets de {"params", indicateurs}.
+    Avec processes > 1, les lots sont répartis sur un pool de processus.
+    """
+    prices = forward_fill(panel.values)
+    chunks = batches(param_sets, prices, processes)
+
+    if processes > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            outputs = list(pool.map(
+                run_batch, itertools.repeat(prices), itertools.repeat(strategy), chunks
+            ))
+    else:
+        outputs = [run_batch(prices, strategy, chunk) for chunk in chunks]
+
+    results = []
+    for chunk, metrics in zip(chunks, outputs):
+        for i, params in enumerate(chunk):
+            results.append({
+                "params": params,
+                **{
+                    name: round(float(values[i]), 6) if np.isfinite(values[i]) else None
+                    for name, values in metrics.items()
+                },
+            })
+    return results
+
+
+def equity_curve(panel, strategy, params):
+    """Valeur du portefeuille (base 1) d'un jeu de paramètres, jour par jour"""
+    weights_fn, defaults = STRATEGIES[strategy]
+    values = {name: np.array([params[name]]) for name in list(defaults) + ["cost_bps"]}
+    prices = forward_fill(panel.values)
+    weights = rebalance_weights(weights_fn(prices, values), values["rebalance"])
+    net, _ = simulate(prices, weights, values["cost_bps"].astype(np.float64))
+    return np.concatenate([[1.0], np.cumprod(1 + net[0])])
+
+
+def backtest_report(panel, strategy, param_sets, processes=1):
+    """Balayage complet : résultats triés par Sharpe et courbe du meilleur jeu"""
+    if panel.values.shape[0] < 2:
+        return {
+            "strategy": strategy, "tickers": panel.tickers, "start": None, "end": None,
+            "runs": len(param_sets), "results": [], "best": None
+        }
+
+    results = sweep(panel, strategy, param_sets, processes)
+    results.sort(key=lambda r: (r["sharpe"] is None, -(r["sharpe"] or 0)))
+    best = results[0]["params"]
+    return {
+        "strategy": strategy,
+        "tickers": panel.tickers,
+        "start": panel.dates[0],
+        "end": panel.dates[-1],
+        "runs": len(param_sets),
+        "results": results,
+        "best": {
+            "params": best,
+            "dates": panel.dates,
+            "equity": np.round(equity_curve(panel, strategy, best), 6).tolist(),
+        },
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest vectorisé sur les clôtures en base")
+    parser.add_argument("--strategy", choices=list(STRATEGIES), default="ma_crossover")
+    parser.add_argument("--tickers", nargs="+", help="Tous les tickers par défaut")
+    parser.add_argument("--days", type=int, help="Profondeur d'historique (tout par défaut)")
+    for name in sorted({p for _, defaults in STRATEGIES.values() for p in defaults}):
+        parser.add_argument(f"--{name}", type=int, nargs="+")
+    parser.add_argument("--cost-bps", type=float, nargs="+")
+    parser.add_argument("--processes", type=int, default=1)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    _, defaults = STRATEGIES[args.strategy]
+    param_sets = param_grid(
+        args.strategy, cost_bps=args.cost_bps,
+        **{name: getattr(args, name) for name in defaults}
+    )
+
+    db = SessionLocal()
+    try:
+        start_date = datetime.now().date() - timedelta(days=args.days) if args.days else None
+        panel = load_close_panel_sync(db, args.tickers, start_date)
+    finally:
+        db.close()
+
+    started = time.perf_counter()
+    report = backtest_report(panel, args.strategy, param_sets, args.processes)
+    elapsed = time.perf_counter() - started
+
+    print(f"📊 {args.strategy}: {report['runs']} jeux de paramètres, "
+          f"{len(panel.dates)} jours × {len(panel.tickers)} tickers en {elapsed:.2f}s")
+    for result in report["results"][:10]:
+        params = ", ".join(f"{k}={v}" for k, v in result["params"].items())
+        print(f"   {params:50s} sharpe={result['sharpe']} "
+              f"rendement={result['total_return']} drawdown={result['max_drawdown']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Cache mémoire des réponses de l'API.
+
+Les données ne changent qu'au passage du chargeur (environ une fois par
+jour). Chaque entrée est indexée par endpoint, paramètres normalisés et
+version des données (table data_versions, incrémentée par le chargeur) :
+une nouvelle version rend toutes les entrées précédentes inaccessibles.
+Le cache est borné en taille (éviction LRU) et en durée (TTL).
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import Response
+from sqlalchemy.exc import SQLAlchemyError
+
+from async_database import get_data_version_async
+from serialization import dumps
+
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "3600"))
+# Intervalle minimal entre deux lectures de la version en base
+CACHE_VERSION_CHECK_SECONDS = float(os.getenv("CACHE_VERSION_CHECK_SECONDS", "5"))
+# max-age envoyé aux clients dans Cache-Control
+CACHE_MAX_AGE = int(os.getenv("CACHE_MAX_AGE", "60"))
+
+
+class TTLCache:
+    """Cache LRU + TTL thread-safe de valeurs quelconques"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Retourne la valeur ou None si absente ou expirée"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ResponseCache(TTLCache):
+    """Cache de réponses JSON déjà sérialisées, indexé par version des données"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS,
+                 version_check=CACHE_VERSION_CHECK_SECONDS):
+        super().__init__(max_entries, ttl)
+        self.version_check = version_check
+        self._version = None
+        self._version_checked_at = 0.0
+
+    async def data_version(self, db):
+        """Version des données, relue en base au plus toutes les version_check s"""
+        now = time.monotonic()
+        if self._version is not None and now - self._version_checked_at < self.version_check:
+            return self._version
+
+        try:
+            version = await get_data_version_async(db)
+        except SQLAlchemyError:
+            # Table absente (chargeur jamais lancé) : seul le TTL s'applique
+            await db.rollback()
+            version = 0
+
+        self._version = version
+        self._version_checked_at = now
+        return version
+
+    def clear(self):
+        super().clear()
+        self._version = None
+
+    async def respond(self, request, db, endpoint, params, compute, headers_for=None):
+        """Retourne la réponse en cache ou la calcule avec await compute()
+
+        Les paramètres valant None sont ignorés dans la clé. La réponse porte
+        un ETag et Cache-Control ; un If-None-Match correspondant reçoit 304.
+        headers_for(data), si fourni, calcule des en-têtes supplémentaires
+        mis en cache avec le corps.
+        """
+        normalized = tuple(sorted(
+            (name, str(value)) for name, value in params.items() if value is not None
+        ))
+        key = (endpoint, normalized, await self.data_version(db))
+
+        cached = self.get(key)
+        if cached is None:
+            data = await compute()
+            extra_headers = headers_for(data) if headers_for else {}
+            body = dumps(data)
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()[:20]
+            self.set(key, (body, etag, extra_headers))
+        else:
+            body, etag, extra_headers = cached
+
+        headers = {
+            **extra_headers,
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={CACHE_MAX_AGE}",
+        }
+
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+def etag_matches(if_none_match, etag):
+    """Compare un en-tête If-None-Match (liste, W/ ou *) à un ETag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(
+        tag.removeprefix("W/") == etag for tag in candidates
+    )
+
+
+response_cache = ResponseCache()
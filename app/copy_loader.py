@@ -0,0 +1,177 @@
+"""
+Écriture des prix par COPY FROM STDIN, pour les bases distantes (Neon).
+
+Sur une connexion TLS vers un pooler distant, chaque aller-retour coûte
+plusieurs dizaines de millisecondes : un INSERT par ligne est borné par la
+latence réseau. Ici les lignes d'un ticker partent en un seul flux CSV
+vers une table temporaire, puis sont fusionnées dans stock_prices par un
+INSERT ... ON CONFLICT, soit une poignée d'allers-retours par ticker quelle
+que soit la longueur de l'historique. Les tickers sont écrits sur
+plusieurs connexions en parallèle, chacun dans sa propre transaction.
+
+La table temporaire est créée et supprimée dans la transaction : le mode
+fonctionne derrière un pooler en mode transaction (PgBouncer de Neon).
+"""
+import csv
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from sqlalchemy import text
+
+from database import bump_data_version
+from ingest import YFinanceSource, TokenBucket, fetch_with_retry
+from partitions import ensure_partitions
+
+COPY_COLUMNS = ("ticker", "date", "open", "high", "low", "close", "volume", "adj_close")
+VALUE_COLUMNS = COPY_COLUMNS[2:]
+
+# Téléchargements simultanés et connexions d'écriture vers la base distante
+COPY_FETCH_WORKERS = 4
+COPY_CONNECTIONS = 4
+
+LOAD_TABLE = "stock_prices_load"
+
+COLUMN_LIST = ", ".join(COPY_COLUMNS)
+
+MERGE_SQL = text(f"""
+    WITH inserted AS (
+        INSERT INTO stock_prices ({COLUMN_LIST})
+        SELECT {COLUMN_LIST} FROM {LOAD_TABLE}
+        ON CONFLICT (ticker, date) DO NOTHING
+        RETURNING 1
+    )
+    SELECT count(*) FROM inserted
+""")
+
+# Mode --update : les lignes déjà présentes sont mises à jour avant la
+# fusion, qui n'insère ensuite que les nouvelles
+UPDATE_SQL = text(f"""
+    UPDATE stock_prices p
+    SET {", ".join(f"{col} = l.{col}" for col in VALUE_COLUMNS)}
+    FROM {LOAD_TABLE} l
+    WHERE p.ticker = l.ticker AND p.date = l.date
+""")
+
+
+def rows_to_csv(rows):
+    """Lignes (format dataframe_to_rows) -> flux CSV pour COPY"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([row[col] for col in COPY_COLUMNS] for row in rows)
+    buffer.seek(0)
+    return buffer
+
+
+def copy_merge_prices(conn, rows, update=False):
+    """Écrit des lignes de prix par COPY puis fusion ; retourne (insérés, ignorés)
+
+    conn est une connexion SQLAlchemy (psycopg2) dans une transaction
+    ouverte ; rien n'est committé.
+    """
+    if not rows:
+        return 0, 0
+
+    dates = [row["date"] for row in rows]
+    ensure_partitions(conn, "stock_prices", min(dates), max(dates))
+
+    conn.execute(text(
+        f"CREATE TEMP TABLE {LOAD_TABLE} (LIKE stock_prices) ON COMMIT DROP"
+    ))
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {LOAD_TABLE} ({COLUMN_LIST}) FROM STDIN WITH (FORMAT csv)",
+            rows_to_csv(rows)
+        )
+    finally:
+        cursor.close()
+
+    if update:
+        conn.execute(UPDATE_SQL)
+    inserted = conn.execute(MERGE_SQL).scalar()
+    conn.execute(text(f"DROP TABLE {LOAD_TABLE}"))
+    return inserted, len(rows) - inserted
+
+
+def copy_load_all(engine, windows, end_date, to_rows, source=None,
+                  workers=COPY_FETCH_WORKERS, connections=COPY_CONNECTIONS,
+                  rate=None, update=False):
+    """Télécharge et écrit plusieurs tickers, en parallèle des deux côtés
+
+    windows associe chaque ticker à sa date de début (voir plan_refresh) et
+    to_rows(ticker, hist) convertit un historique en lignes. Les
+    téléchargements passent par le limiteur de débit et les reprises du
+    pipeline ; chaque ticker téléchargé est écrit sur l'une des
+    connections connexions, dans sa propre transaction.
+
+    Retourne {"inserted", "skipped", "rows_per_sec", "tickers": {ticker:
+    {"rows", "inserted", "seconds"}}, "failed": {ticker: erreur}}.
+    """
+    source = source or YFinanceSource()
+    limiter = TokenBucket(rate) if rate else None
+    stats = {"inserted": 0, "skipped": 0, "tickers": {}, "failed": {}}
+
+    def write(ticker, rows):
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            inserted, skipped = copy_merge_prices(conn, rows, update=update)
+            # Invalide le cache de l'API dans la même transaction
+            if inserted or update:
+                bump_data_version(conn)
+        return inserted, skipped, time.perf_counter() - started
+
+    if windows:
+        # Partitions créées d'avance : les écritures parallèles n'ont pas à
+        # verrouiller la table mère
+        with engine.begin() as conn:
+            ensure_partitions(conn, "stock_prices", min(windows.values()), end_date)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as fetch_pool, \
+            ThreadPoolExecutor(max_workers=connections) as write_pool:
+        downloads = {
+            fetch_pool.submit(
+                fetch_with_retry, source, ticker, start_date, end_date, limiter
+            ): ticker
+            for ticker, start_date in windows.items()
+        }
+
+        writes = {}
+        for future in as_completed(downloads):
+            ticker = downloads[future]
+            try:
+                hist = future.result()
+            except Exception as e:
+                print(f"   ❌ {ticker}: téléchargement en échec ({str(e)})")
+                stats["failed"][ticker] = str(e)
+                continue
+
+            if hist.empty:
+                print(f"   ⚠️  Pas de données pour {ticker}")
+                continue
+
+            rows = to_rows(ticker, hist)
+            writes[write_pool.submit(write, ticker, rows)] = (ticker, len(rows))
+
+        for future in as_completed(writes):
+            ticker, count = writes[future]
+            try:
+                inserted, skipped, seconds = future.result()
+            except Exception as e:
+                print(f"   ❌ {ticker}: écriture en échec ({str(e)})")
+                stats["failed"][ticker] = str(e)
+                continue
+
+            stats["inserted"] += inserted
+            stats["skipped"] += skipped
+            stats["tickers"][ticker] = {
+                "rows": count, "inserted": inserted, "seconds": round(seconds, 3)
+            }
+            print(f"   ✅ {ticker}: {inserted} ajoutées, {skipped} ignorées "
+                  f"({count / seconds:.0f} lignes/s)")
+
+    elapsed = time.perf_counter() - started
+    written = stats["inserted"] + stats["skipped"]
+    stats["rows_per_sec"] = round(written / elapsed, 1) if elapsed else None
+    return stats
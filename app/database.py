@@ -1,15 +1,26 @@
 import os
-from sqlalchemy import create_engine, Column, String, Float, Date, Integer
+from sqlalchemy import create_engine, Column, String, Float, Date, DateTime, Integer, Index, func, select
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 # ⚡ MODIFICATION : Support Docker + Neon
 DATABASE_URL = os.getenv('DATABASE_URL')
 
-if DATABASE_URL:
-    # Mode Cloud (Neon via Render)
-    engine = create_engine(DATABASE_URL)
-else:
+# Réglages du pool de connexions (partagés avec async_database.py)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+
+POOL_OPTIONS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+    "pool_recycle": DB_POOL_RECYCLE,
+}
+
+if not DATABASE_URL:
     # Mode Local (Docker)
     DB_HOST = os.getenv('DB_HOST', 'localhost')
     DB_PORT = os.getenv('DB_PORT', '5433')
@@ -18,7 +29,9 @@ else:
     DB_PASSWORD = os.getenv('DB_PASSWORD', 'cac40_password')
     
     DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    engine = create_engine(DATABASE_URL)
+
+# Mode Cloud (Neon via Render) ou Local (Docker)
+engine = create_engine(DATABASE_URL, **POOL_OPTIONS)
 
 # Le reste ne change pas
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -35,19 +48,172 @@ class Company(Base):
     sector = Column(String)
 
 
-# Modèle pour les données de prix
+# Modèle pour les données de prix.
+# Table partitionnée par année sur date (voir partitions.py) : une clé
+# unique doit contenir la colonne de partitionnement, la clé est donc
+# (ticker, date), portée par l'index ci-dessous, sans identifiant technique.
 class StockPrice(Base):
     __tablename__ = "stock_prices"
+    __table_args__ = {"postgresql_partition_by": "RANGE (date)"}
     
-    id = Column(Integer, primary_key=True, index=True)
-    ticker = Column(String, index=True)
-    date = Column(Date, index=True)
+    ticker = Column(String, nullable=False)
+    date = Column(Date, nullable=False, index=True)
     open = Column(Float)
     high = Column(Float)
     low = Column(Float)
     close = Column(Float)
     volume = Column(Float)
     adj_close = Column(Float)
+    
+    __mapper_args__ = {"primary_key": [ticker, date]}
+
+
+# Index composite unique : toutes les requêtes filtrent par ticker puis
+# trient ou bornent par date. Il sert aussi de cible à ON CONFLICT (ticker, date)
+# et couvre close pour les lectures de cours sans accès à la table.
+# Voir migrations.py pour la création sur une base existante.
+Index(
+    "ix_stock_prices_ticker_date",
+    StockPrice.ticker,
+    StockPrice.date.desc(),
+    unique=True,
+    postgresql_include=["close"],
+)
+
+
+# Barres intrajournalières (1 minute), partitionnées par mois sur ts
+class IntradayPrice(Base):
+    __tablename__ = "intraday_prices"
+    __table_args__ = {"postgresql_partition_by": "RANGE (ts)"}
+    
+    ticker = Column(String, nullable=False)
+    ts = Column(DateTime, nullable=False)
+    open = Column(Float)
+    high = Column(Float)
+    low = Column(Float)
+    close = Column(Float)
+    volume = Column(Float)
+    
+    __mapper_args__ = {"primary_key": [ticker, ts]}
+
+
+Index(
+    "ix_intraday_prices_ticker_ts",
+    IntradayPrice.ticker,
+    IntradayPrice.ts.desc(),
+    unique=True,
+)
+
+
+# Version des données, incrémentée par le chargeur à chaque écriture.
+# L'API s'en sert pour invalider son cache de réponses.
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+    
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+# Agrégats précalculés pour /statistics (voir rollup.py).
+# Sommes cumulées par ticker : une fenêtre = différence de deux lignes.
+class PriceRollup(Base):
+    __tablename__ = "price_rollups"
+    
+    ticker = Column(String, primary_key=True)
+    date = Column(Date, primary_key=True)
+    cum_close = Column(Float, nullable=False)
+    cum_volume = Column(Float, nullable=False)
+    cum_count = Column(Integer, nullable=False)
+
+
+# Min/max de clôture par ticker et par mois
+class PriceMonthlyBlock(Base):
+    __tablename__ = "price_monthly_blocks"
+    
+    ticker = Column(String, primary_key=True)
+    month = Column(Date, primary_key=True)
+    min_close = Column(Float)
+    max_close = Column(Float)
+
+
+# Dernier cours de chaque ticker et ses variations (voir snapshot.py),
+# réécrit par le chargeur : /snapshot se lit en un parcours de la table
+class LatestPrice(Base):
+    __tablename__ = "latest_prices"
+    
+    ticker = Column(String, primary_key=True)
+    date = Column(Date, nullable=False)
+    open = Column(Float)
+    high = Column(Float)
+    low = Column(Float)
+    close = Column(Float)
+    volume = Column(Float)
+    prev_close = Column(Float)
+    # Variations en % depuis la veille, 1 semaine, 1 mois, 3 mois,
+    # le 1er janvier et 1 an (NULL si l'historique est trop court)
+    change_1d = Column(Float)
+    change_1w = Column(Float)
+    change_1m = Column(Float)
+    change_3m = Column(Float)
+    change_ytd = Column(Float)
+    change_1y = Column(Float)
+
+
+# Niveaux des indices reconstitués (voir indices.py), base 1000
+class IndexLevel(Base):
+    __tablename__ = "index_levels"
+    
+    name = Column(String, primary_key=True)
+    date = Column(Date, primary_key=True)
+    level = Column(Float, nullable=False)
+    constituents = Column(Integer, nullable=False)
+
+
+def bump_data_version(db, name="prices"):
+    """Incrémente la version des données (à committer avec l'écriture)"""
+    table = DataVersion.__table__
+    stmt = pg_insert(table).values(name=name, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.name],
+        set_={"version": table.c.version + 1, "updated_at": func.now()}
+    )
+    db.execute(stmt)
+
+
+def sync_data_version(db, name, source="prices"):
+    """Aligne la version name sur la version source (à committer)"""
+    table = DataVersion.__table__
+    current = db.query(DataVersion.version).filter(DataVersion.name == source).scalar() or 0
+    stmt = pg_insert(table).values(name=name, version=current)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.name],
+        set_={"version": current, "updated_at": func.now()}
+    )
+    db.execute(stmt)
+
+
+def versions_query(name, source="prices"):
+    """SELECT (name, version) des versions name et source"""
+    return select(DataVersion.name, DataVersion.version)\
+        .where(DataVersion.name.in_([source, name]))
+
+
+def versions_from_rows(rows, name, source="prices"):
+    """Vrai si la version name a rattrapé la version source"""
+    versions = dict(rows)
+    return versions.get(name) == versions.get(source, 0)
+
+
+def versions_match(db, name, source="prices"):
+    """Vrai si la table dérivée name reflète la dernière écriture de source"""
+    return versions_from_rows(db.execute(versions_query(name, source)).all(), name, source)
+
+
+def get_data_version(db, name="prices"):
+    """Retourne la version courante des données (0 si jamais chargées)"""
+    version = db.query(DataVersion.version).filter(DataVersion.name == name).scalar()
+    return version or 0
 
 
 def init_db():
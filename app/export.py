@@ -0,0 +1,198 @@
+"""
+Export colonnaire de l'historique des prix (Arrow IPC ou Parquet).
+
+Les lignes sortent de PostgreSQL par COPY ... TO STDOUT (CSV) et sont
+analysées par le lecteur CSV de pyarrow directement en colonnes typées :
+aucun objet Python n'est créé par ligne, contrairement au chemin ORM +
+Pydantic de /prices.
+
+L'export est un flux : chaque bloc de CSV reçu est converti en record
+batch puis écrit aussitôt dans le flux Arrow ou Parquet. La mémoire reste
+bornée par la taille d'un bloc (et d'un groupe de lignes Parquet), et les
+premiers octets partent avant la fin du COPY. Une file bornée entre le
+COPY et l'écriture ralentit la lecture si le client consomme lentement.
+"""
+import asyncio
+import io
+
+import anyio
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.ipc as pa_ipc
+import pyarrow.parquet as pq
+
+from async_database import AsyncSessionLocal
+
+EXPORT_SCHEMA = pa.schema([
+    ("ticker", pa.string()),
+    ("date", pa.date32()),
+    ("open", pa.float64()),
+    ("high", pa.float64()),
+    ("low", pa.float64()),
+    ("close", pa.float64()),
+    ("volume", pa.float64()),
+    ("adj_close", pa.float64()),
+])
+
+EXPORT_COLUMNS = "ticker, date, open, high, low, close, volume, adj_close"
+
+
+def export_query(tickers=None, start_date=None, end_date=None):
+    """Requête COPY et ses paramètres, avec les seuls filtres demandés
+
+    Des bornes de date explicites (sans « $2 IS NULL OR ... ») permettent
+    au planificateur d'écarter les partitions annuelles hors période.
+    """
+    conditions, args = [], []
+    for condition, value in (
+        ("ticker = ANY(${}::text[])", tickers or None),
+        ("date >= ${}::date", start_date),
+        ("date <= ${}::date", end_date),
+    ):
+        if value is not None:
+            args.append(value)
+            conditions.append(condition.format(len(args)))
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"""
+        SELECT {EXPORT_COLUMNS}
+        FROM stock_prices
+        {where}
+        ORDER BY ticker, date
+    """
+    return query, args
+
+
+MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Octets de CSV analysés par record batch
+PARSE_BLOCK_BYTES = 1 << 20
+
+# Blocs de COPY en attente au plus entre la base et l'écriture
+COPY_QUEUE_CHUNKS = 16
+
+# Lignes par groupe de lignes Parquet
+PARQUET_ROW_GROUP_ROWS = 131072
+
+CSV_READ_OPTIONS = pa_csv.ReadOptions(column_names=EXPORT_SCHEMA.names)
+CSV_CONVERT_OPTIONS = pa_csv.ConvertOptions(
+    column_types=dict(zip(EXPORT_SCHEMA.names, EXPORT_SCHEMA.types))
+)
+
+
+def parse_csv_block(block):
+    """Lignes CSV complètes -> record batches typés selon EXPORT_SCHEMA"""
+    table = pa_csv.read_csv(
+        pa.py_buffer(block), read_options=CSV_READ_OPTIONS, convert_options=CSV_CONVERT_OPTIONS
+    )
+    return table.to_batches()
+
+
+class CopyAborted(Exception):
+    """Levée dans le COPY quand le client a quitté le flux"""
+
+
+async def iter_record_batches(tickers=None, start_date=None, end_date=None):
+    """Record batches de l'historique demandé, produits au fil du COPY
+
+    La session est ouverte dans le générateur : elle vit aussi longtemps
+    que le flux. Si le client se déconnecte, le COPY est interrompu par
+    une exception levée dans sa fonction de sortie, ce qui laisse la
+    connexion utilisable.
+    """
+    query, args = export_query(tickers, start_date, end_date)
+    queue = asyncio.Queue(maxsize=COPY_QUEUE_CHUNKS)
+    state = {"aborted": False}
+
+    async def output(chunk):
+        if state["aborted"]:
+            raise CopyAborted()
+        await queue.put(chunk)
+
+    session = AsyncSessionLocal()
+    task = None
+    try:
+        connection = await session.connection()
+        raw = await connection.get_raw_connection()
+
+        async def copy():
+            try:
+                await raw.driver_connection.copy_from_query(
+                    query, *args, output=output, format="csv"
+                )
+            finally:
+                # Marqueur de fin, aussi en cas d'erreur, tant que le flux est lu
+                if not state["aborted"]:
+                    await queue.put(None)
+
+        task = asyncio.create_task(copy())
+        pending = b""
+        while (chunk := await queue.get()) is not None:
+            pending += chunk
+            if len(pending) >= PARSE_BLOCK_BYTES:
+                # Coupe à la dernière ligne complète
+                cut = pending.rfind(b"\n") + 1
+                for batch in parse_csv_block(pending[:cut]):
+                    yield batch
+                pending = pending[cut:]
+        # Propage une éventuelle erreur du COPY
+        await task
+        if pending:
+            for batch in parse_csv_block(pending):
+                yield batch
+    finally:
+        # Protégé de l'annulation du flux par Starlette (déconnexion) : le
+        # COPY doit se terminer avant de rendre la connexion au pool
+        with anyio.CancelScope(shield=True):
+            if task is not None and not task.done():
+                state["aborted"] = True
+                # Vide la file pour débloquer un put en attente
+                while not queue.empty():
+                    queue.get_nowait()
+                try:
+                    await task
+                except CopyAborted:
+                    pass
+            await session.close()
+
+
+def drain(sink):
+    """Octets écrits dans sink depuis le dernier appel"""
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+
+async def iter_arrow_stream(batches):
+    """Flux Arrow IPC : le schéma, puis un message par record batch"""
+    sink = io.BytesIO()
+    writer = pa_ipc.new_stream(sink, EXPORT_SCHEMA)
+    async for batch in batches:
+        writer.write_batch(batch)
+        yield drain(sink)
+    # Marqueur de fin de flux écrit à la fermeture
+    writer.close()
+    yield drain(sink)
+
+
+async def iter_parquet(batches):
+    """Fichier Parquet (zstd) écrit groupe de lignes par groupe de lignes"""
+    sink = io.BytesIO()
+    writer = pq.ParquetWriter(sink, EXPORT_SCHEMA, compression="zstd")
+    group, rows = [], 0
+    async for batch in batches:
+        group.append(batch)
+        rows += batch.num_rows
+        if rows >= PARQUET_ROW_GROUP_ROWS:
+            writer.write_table(pa.Table.from_batches(group, EXPORT_SCHEMA))
+            group, rows = [], 0
+            yield drain(sink)
+    if group:
+        writer.write_table(pa.Table.from_batches(group, EXPORT_SCHEMA))
+    # Pied de fichier (métadonnées) écrit à la fermeture
+    writer.close()
+    yield drain(sink)
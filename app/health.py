@@ -0,0 +1,142 @@
+"""
+Sondes de santé peu coûteuses.
+
+- Vivacité : un SELECT 1 borné par HEALTH_TIMEOUT_SECONDS.
+- Disponibilité et statistiques : un résumé (entreprises, nombre estimé de
+  prix, dernière date, version des données) recalculé en tâche de fond
+  toutes les HEALTH_REFRESH_SECONDS. Le nombre de prix vient des
+  statistiques du catalogue (pg_class.reltuples des partitions, tenues
+  à jour par ANALYZE/autovacuum) plutôt que d'un COUNT(*) sur toute la table.
+
+Les sondes lisent le résumé en mémoire : elles ne touchent pas la base.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from async_database import AsyncSessionLocal, get_data_version_async
+from database import Company, StockPrice
+
+HEALTH_TIMEOUT_SECONDS = float(os.getenv("HEALTH_TIMEOUT_SECONDS", "2"))
+HEALTH_REFRESH_SECONDS = float(os.getenv("HEALTH_REFRESH_SECONDS", "30"))
+# Au-delà de ce nombre d'intervalles sans rafraîchissement, l'API n'est plus prête
+HEALTH_STALE_INTERVALS = 3
+
+# Somme des estimations des partitions (ou de la table elle-même si elle
+# n'est pas partitionnée). reltuples vaut -1 pour une table jamais
+# analysée : NULL si aucune ne l'a été, sinon les autres comptent pour 0.
+ESTIMATE_SQL = text("""
+    SELECT CASE WHEN max(c.reltuples) < 0 THEN NULL
+                ELSE sum(greatest(c.reltuples, 0))::bigint END
+    FROM pg_class c
+    WHERE c.relkind = 'r'
+      AND (c.oid = to_regclass('stock_prices')
+           OR c.oid IN (SELECT inhrelid FROM pg_inherits
+                        WHERE inhparent = to_regclass('stock_prices')))
+""")
+
+
+async def ping(timeout=HEALTH_TIMEOUT_SECONDS):
+    """SELECT 1 avec délai maximal ; lève une exception en cas d'échec"""
+    async def run():
+        async with AsyncSessionLocal() as session:
+            await session.execute(text("SELECT 1"))
+
+    await asyncio.wait_for(run(), timeout)
+
+
+async def collect_summary(db):
+    """Résumé de la base sans parcours complet de stock_prices"""
+    companies = (await db.execute(select(func.count()).select_from(Company))).scalar()
+    estimate = (await db.execute(ESTIMATE_SQL)).scalar()
+    if estimate is None or estimate < 0:
+        # Jamais analysée (base toute neuve) : un comptage exact, une seule fois
+        estimate = (await db.execute(select(func.count()).select_from(StockPrice))).scalar()
+    last_date = (await db.execute(select(func.max(StockPrice.date)))).scalar()
+
+    try:
+        version = await get_data_version_async(db)
+    except SQLAlchemyError:
+        # Table data_versions absente tant que le chargeur n'a pas tourné
+        await db.rollback()
+        version = 0
+
+    return {
+        "companies": companies,
+        "price_records": int(estimate),
+        "price_records_estimated": True,
+        "last_date": last_date,
+        "data_version": version,
+    }
+
+
+class HealthMonitor:
+    """Résumé de santé rafraîchi en tâche de fond"""
+
+    def __init__(self, interval=HEALTH_REFRESH_SECONDS):
+        self.interval = interval
+        self.summary = None
+        self.error = None
+        self.refreshed_at = None
+        self._checked_at = None
+        self._task = None
+
+    async def refresh(self):
+        try:
+            async with AsyncSessionLocal() as session:
+                summary = await asyncio.wait_for(
+                    collect_summary(session), HEALTH_TIMEOUT_SECONDS * 5
+                )
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+        else:
+            self.summary = summary
+            self.error = None
+            self.refreshed_at = datetime.now()
+            self._checked_at = time.monotonic()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.refresh()
+
+    def start(self):
+        """Lance le rafraîchissement périodique (après un premier refresh())"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def ready(self):
+        """Vrai si le dernier rafraîchissement a réussi récemment"""
+        return (
+            self.error is None
+            and self._checked_at is not None
+            and time.monotonic() - self._checked_at < self.interval * HEALTH_STALE_INTERVALS
+        )
+
+    def report(self):
+        report = {
+            "status": "healthy" if self.ready else "unavailable",
+            "database": "connected" if self.ready else "error",
+            **(self.summary or {}),
+            "refreshed_at": self.refreshed_at,
+        }
+        if self.error:
+            report["error"] = self.error
+        return report
+
+
+health_monitor = HealthMonitor()
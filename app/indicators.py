@@ -0,0 +1,128 @@
+"""
+Indicateurs techniques calculés côté serveur.
+
+Chaque indicateur est une fonction vectorisée (pandas/NumPy) qui prend le
+DataFrame complet des prix d'un ticker (index de dates, colonnes
+open/high/low/close/volume) et retourne une ou plusieurs séries alignées.
+Les indicateurs sont demandés sous la forme "nom" ou "nom:fenêtre",
+par exemple "sma:50" ou "rsi:14".
+"""
+import numpy as np
+import pandas as pd
+
+# Jours de bourse par an, pour annualiser la volatilité
+TRADING_DAYS = 252
+# Écarts-types des bandes de Bollinger
+BOLLINGER_STD = 2.0
+
+
+def sma(prices, window):
+    """Moyenne mobile simple de la clôture"""
+    return {f"sma_{window}": prices["close"].rolling(window).mean()}
+
+
+def ema(prices, window):
+    """Moyenne mobile exponentielle de la clôture (span = fenêtre)"""
+    return {f"ema_{window}": prices["close"].ewm(span=window, adjust=False).mean()}
+
+
+def returns(prices, window):
+    """Rendements simples et logarithmiques sur la fenêtre (1 : quotidiens)
+
+    La fenêtre entre dans le nom des séries au-delà d'un jour, pour que
+    "returns" et "returns:5" puissent être demandés ensemble.
+    """
+    close = prices["close"]
+    suffix = "" if window == 1 else f"_{window}"
+    return {
+        f"returns{suffix}": close.pct_change(window),
+        f"log_returns{suffix}": np.log(close).diff(window),
+    }
+
+
+def volatility(prices, window):
+    """Volatilité glissante annualisée des rendements logarithmiques"""
+    log_returns = np.log(prices["close"]).diff()
+    return {
+        f"volatility_{window}": log_returns.rolling(window).std() * np.sqrt(TRADING_DAYS)
+    }
+
+
+def rsi(prices, window):
+    """RSI de Wilder (moyennes exponentielles alpha = 1/fenêtre)"""
+    delta = prices["close"].diff()
+    gain = delta.clip(lower=0).ewm(alpha=1 / window, adjust=False, min_periods=window).mean()
+    loss = (-delta.clip(upper=0)).ewm(alpha=1 / window, adjust=False, min_periods=window).mean()
+    rs = gain / loss
+    return {f"rsi_{window}": 100 - 100 / (1 + rs)}
+
+
+def bollinger(prices, window):
+    """Bandes de Bollinger : moyenne mobile ± BOLLINGER_STD écarts-types"""
+    close = prices["close"]
+    middle = close.rolling(window).mean()
+    std = close.rolling(window).std()
+    return {
+        f"bollinger_{window}_middle": middle,
+        f"bollinger_{window}_upper": middle + BOLLINGER_STD * std,
+        f"bollinger_{window}_lower": middle - BOLLINGER_STD * std,
+    }
+
+
+def drawdown(prices, window):
+    """Baisse de la clôture depuis son plus haut sur la fenêtre glissante"""
+    close = prices["close"]
+    peak = close.rolling(window, min_periods=1).max()
+    return {f"drawdown_{window}": close / peak - 1}
+
+
+# nom -> (fonction, fenêtre par défaut)
+INDICATORS = {
+    "sma": (sma, 20),
+    "ema": (ema, 20),
+    "returns": (returns, 1),
+    "volatility": (volatility, 20),
+    "rsi": (rsi, 14),
+    "bollinger": (bollinger, 20),
+    "drawdown": (drawdown, TRADING_DAYS),
+}
+
+MAX_WINDOW = 2 * TRADING_DAYS
+
+
+def parse_spec(spec):
+    """Transforme "nom[:fenêtre]" en (nom, fenêtre) ; lève ValueError"""
+    name, _, window = spec.strip().lower().partition(":")
+    if name not in INDICATORS:
+        raise ValueError(f"Indicateur inconnu: {name}")
+
+    window = int(window) if window else INDICATORS[name][1]
+    if not 1 <= window <= MAX_WINDOW:
+        raise ValueError(f"Fenêtre hors limites pour {name}: {window}")
+    return name, window
+
+
+def compute_indicator(prices, name, window):
+    """Calcule un indicateur sur tout l'historique fourni"""
+    function, _ = INDICATORS[name]
+    return function(prices, window)
+
+
+def warmup_days(specs):
+    """Jours calendaires d'historique à charger avant la période demandée
+    pour que les fenêtres glissantes soient remplies dès son début"""
+    longest = max((window for _, window in specs), default=1)
+    # ~1,5 jour calendaire par jour de bourse, plus une marge pour les EMA
+    return int(longest * 1.5 * 3) + 10
+
+
+def to_json_list(series):
+    """Série pandas -> liste JSON (NaN et infinis deviennent null)"""
+    values = series.to_numpy(dtype=float)
+    return [None if not np.isfinite(v) else round(float(v), 6) for v in values]
+
+
+def prices_frame(rows):
+    """Lignes (date, open, high, low, close, volume) -> DataFrame indexé par date"""
+    frame = pd.DataFrame(rows, columns=["date", "open", "high", "low", "close", "volume"])
+    return frame.set_index("date").astype(float)
@@ -0,0 +1,267 @@
+"""
+Indices reconstitués à partir des clôtures de stock_prices.
+
+- equal_weight : tous les tickers du référentiel, à poids égaux ;
+- sector:<secteur> : un sous-indice équipondéré par secteur ;
+- indices à poids fixes déclarés dans le fichier JSON INDEX_WEIGHTS_FILE,
+  de la forme {"nom": {"MC.PA": 0.3, "OR.PA": 0.2, ...}} ; les noms
+  custom, equal_weight et sector:* sont réservés.
+
+Les poids sont appliqués chaque jour aux seuls constituants cotés la veille
+et le jour même : le rendement d'un indice est la moyenne pondérée des
+rendements disponibles. Tous les indices sortent d'une seule passe
+vectorisée, rendements (jours × tickers) @ poids (tickers × indices), puis
+d'un produit cumulé. Base BASE_LEVEL au premier jour coté.
+
+Le chargeur prolonge index_levels à partir de la première date modifiée en
+enchaînant sur le dernier niveau connu, puis aligne la version "index" sur
+la version "prices" ; tant que les deux diffèrent, l'API recalcule les
+séries à la volée. Après une modification d'INDEX_WEIGHTS_FILE, tout
+l'historique est à reconstruire : python indices.py
+"""
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import desc, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from async_database import versions_match_async
+from database import (
+    Company, IndexLevel, SessionLocal, sync_data_version, versions_match
+)
+from panel import load_close_panel_sync
+
+INDEX_VERSION = "index"
+BASE_LEVEL = 1000.0
+EQUAL_WEIGHT = "equal_weight"
+SECTOR_PREFIX = "sector:"
+# Nom servi par la route /indices/custom (indice calculé à la volée)
+CUSTOM_INDEX = "custom"
+INDEX_WEIGHTS_FILE = os.getenv("INDEX_WEIGHTS_FILE")
+
+# Lignes par INSERT groupé dans index_levels
+INSERT_BATCH_SIZE = 5000
+
+
+def load_custom_weights(path=INDEX_WEIGHTS_FILE):
+    """{nom: {ticker: poids}} du fichier JSON (vide sans fichier)"""
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        definitions = json.load(f)
+
+    custom = {}
+    for name, weights in definitions.items():
+        # Noms masqués par /indices/custom ou par les indices intégrés
+        if name in (CUSTOM_INDEX, EQUAL_WEIGHT) or name.startswith(SECTOR_PREFIX):
+            raise ValueError(f"Indice {name}: nom réservé")
+        weights = {ticker: float(weight) for ticker, weight in weights.items()}
+        if not weights or min(weights.values()) <= 0:
+            raise ValueError(f"Indice {name}: les poids doivent être strictement positifs")
+        custom[name] = weights
+    return custom
+
+
+def index_definitions(companies, custom=None):
+    """{nom: {ticker: poids}} des indices persistés
+
+    companies est un itérable de (ticker, secteur) ; l'indice équipondéré
+    vient en premier, puis les secteurs par ordre alphabétique et enfin
+    les indices configurés.
+    """
+    equal = {}
+    sectors = {}
+    for ticker, sector in companies:
+        equal[ticker] = 1.0
+        if sector:
+            sectors.setdefault(f"{SECTOR_PREFIX}{sector}", {})[ticker] = 1.0
+
+    definitions = {EQUAL_WEIGHT: equal}
+    definitions.update(sorted(sectors.items()))
+    definitions.update(custom or {})
+    return definitions
+
+
+def index_kind(name):
+    if name == EQUAL_WEIGHT:
+        return "equal_weight"
+    if name.startswith(SECTOR_PREFIX):
+        return "sector"
+    return "custom"
+
+
+def weight_matrix(definitions, tickers):
+    """(noms, poids tickers × indices) ; les tickers hors panel sont ignorés"""
+    names = list(definitions)
+    position = {ticker: i for i, ticker in enumerate(tickers)}
+    weights = np.zeros((len(tickers), len(names)))
+    for j, name in enumerate(names):
+        for ticker, weight in definitions[name].items():
+            if ticker in position:
+                weights[position[ticker], j] = weight
+    return names, weights
+
+
+def compute_levels(panel, weights, base_levels=None):
+    """Niveaux (jours × indices) et nombre de constituants cotés chaque jour
+
+    base_levels donne, par indice, son niveau à la première date du panel
+    pour prolonger une série existante ; None fait démarrer l'indice à
+    BASE_LEVEL au premier jour où l'un de ses constituants est coté. Les
+    niveaux antérieurs au démarrage valent NaN.
+    """
+    n, k = panel.values.shape[0], weights.shape[1]
+    if n == 0:
+        return np.empty((0, k)), np.zeros((0, k), dtype=int)
+    if base_levels is None:
+        base_levels = [None] * k
+
+    quoted = np.isfinite(panel.values)
+    counts = quoted.astype(np.float64) @ (weights > 0)
+
+    # Moyenne pondérée des rendements disponibles : deux produits matriciels
+    returns = panel.returns()
+    valid = np.isfinite(returns)
+    total = np.where(valid, returns, 0.0) @ weights
+    covered = valid.astype(np.float64) @ weights
+    daily = np.divide(total, covered, out=np.zeros_like(total), where=covered > 0)
+    growth = np.vstack([np.ones((1, k)), np.cumprod(1 + daily, axis=0)])
+
+    continued = np.array([base is not None for base in base_levels])
+    start = np.where(continued, 0, np.argmax(counts > 0, axis=0))
+    base = np.array([BASE_LEVEL if level is None else level for level in base_levels])
+
+    levels = base * growth / growth[start, np.arange(k)]
+    levels[np.arange(n)[:, None] < start] = np.nan
+    levels[:, ~(continued | (counts > 0).any(axis=0))] = np.nan
+    return levels, counts.astype(int)
+
+
+def series_from_panel(panel, definitions):
+    """Calcul à la volée : {nom: {"dates", "levels", "constituents"}}"""
+    names, weights = weight_matrix(definitions, panel.tickers)
+    levels, counts = compute_levels(panel, weights)
+
+    series = {}
+    for j, name in enumerate(names):
+        started = np.isfinite(levels[:, j])
+        series[name] = {
+            "dates": [d for d, keep in zip(panel.dates, started) if keep],
+            "levels": np.round(levels[started, j], 4).tolist(),
+            "constituents": counts[started, j].tolist(),
+        }
+    return series
+
+
+def refresh_index_levels(db, since_by_ticker=None):
+    """Prolonge index_levels à partir de la première date modifiée
+
+    since_by_ticker a la forme de refresh_rollups ({ticker: première date
+    modifiée}) ; avec None, tout l'historique est reconstruit. Retourne le
+    nombre de niveaux écrits. Ne committe pas.
+    """
+    definitions = index_definitions(
+        db.query(Company.ticker, Company.sector).all(), load_custom_weights()
+    )
+    start_date = None
+    base = {}
+    if since_by_ticker is not None:
+        if not since_by_ticker:
+            sync_data_version(db, INDEX_VERSION)
+            return 0
+        since = min(
+            day.date() if isinstance(day, datetime) else day
+            for day in since_by_ticker.values()
+        )
+        # Dernier jour calculé avant la modification : point d'enchaînement
+        start_date = db.query(func.max(IndexLevel.date))\
+            .filter(IndexLevel.date < since).scalar()
+        if start_date is not None:
+            base = dict(
+                db.query(IndexLevel.name, IndexLevel.level)
+                .filter(IndexLevel.date == start_date).all()
+            )
+
+    tickers = sorted({ticker for weights in definitions.values() for ticker in weights})
+    panel = load_close_panel_sync(db, tickers, start_date)
+    if start_date is not None and (not panel.dates or panel.dates[0] != start_date):
+        # Historique modifié sous le point d'enchaînement : on repart de zéro
+        return refresh_index_levels(db)
+
+    if start_date is None:
+        db.query(IndexLevel).delete()
+    else:
+        db.query(IndexLevel).filter(IndexLevel.date > start_date).delete()
+
+    names, weights = weight_matrix(definitions, panel.tickers)
+    levels, counts = compute_levels(panel, weights, [base.get(name) for name in names])
+
+    # La première ligne d'un prolongement est déjà en base
+    first = 0 if start_date is None else 1
+    days, columns = np.nonzero(np.isfinite(levels[first:]))
+    days += first
+    rows = [
+        {"name": names[j], "date": panel.dates[i], "level": level, "constituents": count}
+        for i, j, level, count in zip(
+            days.tolist(), columns.tolist(),
+            levels[days, columns].tolist(), counts[days, columns].tolist()
+        )
+    ]
+
+    stmt = pg_insert(IndexLevel.__table__)
+    for i in range(0, len(rows), INSERT_BATCH_SIZE):
+        db.execute(stmt, rows[i:i + INSERT_BATCH_SIZE])
+
+    sync_data_version(db, INDEX_VERSION)
+    return len(rows)
+
+
+def index_is_current_sync(db):
+    """Vrai si index_levels reflète la dernière écriture du chargeur"""
+    return versions_match(db, INDEX_VERSION)
+
+
+async def index_is_current(db):
+    """Équivalent asynchrone de index_is_current_sync"""
+    return await versions_match_async(db, INDEX_VERSION)
+
+
+async def latest_index_levels(db):
+    """Dernier niveau de chaque indice persisté"""
+    result = await db.execute(
+        select(IndexLevel.name, IndexLevel.date, IndexLevel.level, IndexLevel.constituents)
+        .distinct(IndexLevel.name)
+        .order_by(IndexLevel.name, desc(IndexLevel.date))
+    )
+    return result.all()
+
+
+async def read_index_series(db, name, start_date=None, end_date=None):
+    """Série persistée d'un indice : {"dates", "levels", "constituents"}"""
+    query = select(IndexLevel.date, IndexLevel.level, IndexLevel.constituents)\
+        .where(IndexLevel.name == name)\
+        .order_by(IndexLevel.date)
+    if start_date:
+        query = query.where(IndexLevel.date >= start_date)
+    if end_date:
+        query = query.where(IndexLevel.date <= end_date)
+    rows = (await db.execute(query)).all()
+
+    return {
+        "dates": [row.date for row in rows],
+        "levels": [round(row.level, 4) for row in rows],
+        "constituents": [row.constituents for row in rows],
+    }
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        print("📈 Reconstruction des indices...")
+        written = refresh_index_levels(db)
+        db.commit()
+        print(f"✅ {written} niveaux écrits")
+    finally:
+        db.close()
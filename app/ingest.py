@@ -0,0 +1,80 @@
+"""
+Briques du pipeline de téléchargement : sources de données, limiteur de
+débit et reprise sur erreur.
+
+Une source est n'importe quel objet exposant
+history(ticker, start_date, end_date) -> DataFrame au format yfinance
+(index de dates, colonnes Open/High/Low/Close/Volume). Cela permet de
+remplacer Yahoo Finance par une source locale.
+"""
+import random
+import threading
+import time
+
+import yfinance as yf
+
+
+class YFinanceSource:
+    """Source par défaut : Yahoo Finance via yfinance
+
+    interval="1m" donne des barres intrajournalières (7 derniers jours).
+    """
+
+    def __init__(self, interval="1d"):
+        self.interval = interval
+
+    def history(self, ticker, start_date, end_date):
+        return yf.Ticker(ticker).history(
+            start=start_date, end=end_date, interval=self.interval
+        )
+
+
+class TokenBucket:
+    """Limiteur de débit à seau de jetons, partagé entre les threads
+
+    rate jetons sont ajoutés par seconde, jusqu'à capacity. Chaque appel à
+    acquire() consomme un jeton et attend s'il n'y en a plus.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._last) * self.rate
+                )
+                self._last = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+
+def fetch_with_retry(source, ticker, start_date, end_date, limiter=None,
+                     retries=3, base_delay=1.0):
+    """Télécharge l'historique d'un ticker avec reprise exponentielle
+
+    Attend base_delay * 2^tentative (plus une gigue aléatoire) entre deux
+    essais. L'exception de la dernière tentative est propagée.
+    """
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return source.history(ticker, start_date, end_date)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = base_delay * (2 ** attempt) * (1 + random.random() * 0.25)
+            print(f"   🔁 {ticker}: {str(e)} — nouvel essai dans {delay:.1f}s")
+            time.sleep(delay)
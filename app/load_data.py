@@ -1,7 +1,43 @@
-import yfinance as yf
+import argparse
+import numpy as np
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from database import init_db, SessionLocal, Company, StockPrice
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from database import (
+    init_db, engine, SessionLocal, Company, StockPrice, IntradayPrice, bump_data_version
+)
+from migrations import migrate
+from ingest import YFinanceSource, TokenBucket, fetch_with_retry
+from partitions import ensure_partitions
+from copy_loader import copy_load_all, COPY_CONNECTIONS
+from rollup import refresh_rollups, rollups_are_current_sync
+from snapshot import refresh_snapshot, snapshot_is_current_sync
+from indices import refresh_index_levels, index_is_current_sync
+from price_store import write_price_store, PRICE_STORE_DIR
+
+# Nombre de lignes par INSERT groupé (8 paramètres par ligne)
+BULK_BATCH_SIZE = 1000
+
+# Pipeline concurrent : téléchargements simultanés, débit maximal vers
+# Yahoo Finance (requêtes/s) et taille des lots écrits par le rédacteur
+FETCH_WORKERS = 4
+FETCH_RATE = 2.0
+WRITE_BATCH_ROWS = 5000
+
+# Profondeur d'historique d'un chargement complet
+HISTORY_DAYS = 730
+
+# Barres 1 minute : Yahoo Finance n'en fournit que sur 7 jours glissants
+INTRADAY_INTERVAL = "1m"
+INTRADAY_DAYS = 7
+
+# Mode incrémental : un ticker dont l'historique commence plus de
+# GAP_TOLERANCE_DAYS après le début de la fenêtre, ou qui contient moins de
+# MIN_COVERAGE des jours ouvrés attendus, est rechargé en entier
+GAP_TOLERANCE_DAYS = 7
+MIN_COVERAGE = 0.9
 
 # Liste des principales entreprises du CAC 40 avec leurs tickers Yahoo Finance
 CAC40_COMPANIES = {
@@ -46,6 +82,7 @@ def load_companies(db):
     """Charge la liste des entreprises dans la base de données"""
     print("📋 Chargement de la liste des entreprises...")
     
+    added = 0
     for ticker, info in CAC40_COMPANIES.items():
         company = db.query(Company).filter(Company.ticker == ticker).first()
         if not company:
@@ -55,22 +92,114 @@ def load_companies(db):
                 sector=info["sector"]
             )
             db.add(company)
+            added += 1
     
+    if added:
+        bump_data_version(db)
     db.commit()
     print(f"✅ {len(CAC40_COMPANIES)} entreprises chargées")
 
 
-def load_stock_data(db, ticker, start_date, end_date):
+def dataframe_to_rows(ticker, hist):
+    """Convertit un DataFrame yfinance en lignes prêtes pour un INSERT groupé
+
+    Les colonnes sont extraites en tableaux NumPy d'un seul coup plutôt que
+    ligne par ligne avec iterrows().
+    """
+    dates = hist.index.date
+    opens = hist['Open'].to_numpy(dtype=float)
+    highs = hist['High'].to_numpy(dtype=float)
+    lows = hist['Low'].to_numpy(dtype=float)
+    closes = hist['Close'].to_numpy(dtype=float)
+    volumes = hist['Volume'].to_numpy(dtype=float)
+
+    return [
+        {
+            "ticker": ticker,
+            "date": d,
+            "open": o,
+            "high": h,
+            "low": l,
+            "close": c,
+            "volume": v,
+            "adj_close": c,
+        }
+        for d, o, h, l, c, v in zip(
+            dates, opens.tolist(), highs.tolist(), lows.tolist(),
+            closes.tolist(), volumes.tolist()
+        )
+    ]
+
+
+def ensure_price_partitions(db, table, values):
+    """Crée les partitions de table couvrant les dates de values"""
+    if len(values):
+        ensure_partitions(db.connection(), table, min(values), max(values))
+
+
+def bulk_upsert_prices(db, rows, update=False, batch_size=BULK_BATCH_SIZE):
+    """Écrit des lignes de prix en INSERT ... ON CONFLICT (ticker, date)
+
+    Retourne un tuple (insérés, ignorés). Avec update=True les lignes déjà
+    présentes sont mises à jour et comptées comme ignorées (non nouvelles).
+    """
+    inserted = 0
+    table = StockPrice.__table__
+    ensure_price_partitions(db, "stock_prices", [row["date"] for row in rows])
+
+    keys = [table.c.ticker, table.c.date]
+    # RETURNING ne renvoie que les lignes réellement insérées (xmax n'est
+    # pas lisible dans le RETURNING d'une table partitionnée)
+    insert_stmt = pg_insert(table).on_conflict_do_nothing(
+        index_elements=keys
+    ).returning(*keys)
+    if update:
+        update_stmt = pg_insert(table)
+        update_stmt = update_stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={
+                col: update_stmt.excluded[col]
+                for col in ("open", "high", "low", "close", "volume", "adj_close")
+            }
+        )
+
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i:i + batch_size]
+        # executemany : SQLAlchemy regroupe les lignes en INSERT multi-VALUES
+        new_keys = set(db.execute(insert_stmt, batch).tuples())
+        inserted += len(new_keys)
+        if update and len(new_keys) < len(batch):
+            # Seconde passe sur les seules lignes déjà présentes
+            db.execute(update_stmt, [
+                row for row in batch if (row["ticker"], row["date"]) not in new_keys
+            ])
+
+    return inserted, len(rows) - inserted
+
+
+def load_stock_data(db, ticker, start_date, end_date, bulk=True, update=False,
+                    source=None):
     """Charge les données historiques d'une action"""
+    source = source or YFinanceSource()
     try:
         print(f"   Téléchargement de {ticker}...")
-        stock = yf.Ticker(ticker)
-        hist = stock.history(start=start_date, end=end_date)
+        hist = source.history(ticker, start_date, end_date)
         
         if hist.empty:
             print(f"   ⚠️  Pas de données pour {ticker}")
             return 0
+
+        if bulk:
+            inserted, skipped = bulk_upsert_prices(
+                db, dataframe_to_rows(ticker, hist), update=update
+            )
+            if inserted or update:
+                bump_data_version(db)
+            db.commit()
+            print(f"   ✅ {inserted} nouveaux enregistrements pour {ticker} ({skipped} ignorés)")
+            return inserted
         
+        ensure_price_partitions(db, "stock_prices", hist.index.date)
         count = 0
         for date, row in hist.iterrows():
             # Vérifier si l'entrée existe déjà
@@ -94,6 +223,7 @@ def load_stock_data(db, ticker, start_date, end_date):
                 count += 1
         
         if count > 0:
+            bump_data_version(db)
             db.commit()
         
         print(f"   ✅ {count} nouveaux enregistrements pour {ticker}")
@@ -105,8 +235,237 @@ def load_stock_data(db, ticker, start_date, end_date):
         return 0
 
 
-def main():
+def get_high_water_marks(db):
+    """Retourne {ticker: (première date, dernière date, nombre de lignes)}
+
+    Une seule requête groupée sur l'index (ticker, date).
+    """
+    rows = db.query(
+        StockPrice.ticker,
+        func.min(StockPrice.date),
+        func.max(StockPrice.date),
+        func.count()
+    ).group_by(StockPrice.ticker).all()
+
+    return {ticker: (first, last, count) for ticker, first, last, count in rows}
+
+
+def plan_refresh(marks, tickers, start_date, end_date, full=False):
+    """Calcule la date de début de téléchargement de chaque ticker
+
+    Les tickers nouveaux ou troués repartent de start_date, les autres
+    reprennent au lendemain de leur dernière date. Les tickers déjà à jour
+    sont absents du résultat.
+    """
+    start_day = start_date.date()
+    end_day = end_date.date()
+    windows = {}
+
+    for ticker in tickers:
+        mark = marks.get(ticker)
+        if full or mark is None:
+            windows[ticker] = start_date
+            continue
+
+        first, last, count = mark
+        expected = np.busday_count(first, last + timedelta(days=1))
+        has_gap = (
+            (first - start_day).days > GAP_TOLERANCE_DAYS
+            or count < expected * MIN_COVERAGE
+        )
+        if has_gap:
+            windows[ticker] = start_date
+            continue
+
+        # end_date est exclusive pour yfinance
+        next_day = last + timedelta(days=1)
+        if next_day < end_day:
+            windows[ticker] = datetime.combine(next_day, datetime.min.time())
+
+    return windows
+
+
+def load_all_stock_data(db, windows, end_date, source=None,
+                        workers=FETCH_WORKERS, rate=FETCH_RATE, update=False,
+                        batch_rows=WRITE_BATCH_ROWS):
+    """Télécharge plusieurs tickers en parallèle et écrit par lots
+
+    windows associe chaque ticker à sa date de début (voir plan_refresh).
+
+    Les téléchargements tournent dans un pool de workers borné, limité par
+    un seau de jetons et repris avec un délai exponentiel en cas d'échec.
+    Le thread appelant est le seul rédacteur : il accumule les lignes des
+    tickers terminés et les écrit par lots de batch_rows lignes.
+
+    Retourne un dict {"inserted", "skipped", "failed": [tickers]}.
+    """
+    source = source or YFinanceSource()
+    limiter = TokenBucket(rate)
+    stats = {"inserted": 0, "skipped": 0, "failed": []}
+    pending = []
+
+    def flush():
+        if not pending:
+            return
+        inserted, skipped = bulk_upsert_prices(db, pending, update=update)
+        # Invalide le cache de l'API dans la même transaction que l'écriture
+        if inserted or update:
+            bump_data_version(db)
+        db.commit()
+        stats["inserted"] += inserted
+        stats["skipped"] += skipped
+        pending.clear()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(
+                fetch_with_retry, source, ticker, start_date, end_date, limiter
+            ): ticker
+            for ticker, start_date in windows.items()
+        }
+
+        for future in as_completed(futures):
+            ticker = futures[future]
+            try:
+                hist = future.result()
+            except Exception as e:
+                print(f"   ❌ Erreur pour {ticker}: {str(e)}")
+                stats["failed"].append(ticker)
+                continue
+
+            if hist.empty:
+                print(f"   ⚠️  Pas de données pour {ticker}")
+                continue
+
+            rows = dataframe_to_rows(ticker, hist)
+            pending.extend(rows)
+            print(f"   📥 {ticker}: {len(rows)} lignes téléchargées")
+
+            if len(pending) >= batch_rows:
+                flush()
+
+        flush()
+
+    return stats
+
+
+def intraday_to_rows(ticker, hist):
+    """Convertit des barres yfinance intrajournalières en lignes intraday_prices
+
+    Les horodatages sont ramenés à l'heure de Paris, sans fuseau.
+    """
+    index = hist.index
+    if index.tz is not None:
+        index = index.tz_convert("Europe/Paris").tz_localize(None)
+
+    return [
+        {"ticker": ticker, "ts": ts, "open": o, "high": h, "low": l, "close": c, "volume": v}
+        for ts, o, h, l, c, v in zip(
+            index.to_pydatetime(),
+            hist['Open'].to_numpy(dtype=float).tolist(),
+            hist['High'].to_numpy(dtype=float).tolist(),
+            hist['Low'].to_numpy(dtype=float).tolist(),
+            hist['Close'].to_numpy(dtype=float).tolist(),
+            hist['Volume'].to_numpy(dtype=float).tolist(),
+        )
+    ]
+
+
+def load_intraday_data(db, tickers, end_date, source=None, days=INTRADAY_DAYS,
+                       rate=FETCH_RATE, batch_size=BULK_BATCH_SIZE):
+    """Charge les barres 1 minute des derniers jours dans intraday_prices
+
+    Les partitions mensuelles manquantes sont créées au fil de l'eau ; les
+    barres déjà présentes sont ignorées. Retourne {"inserted", "failed"}.
+    """
+    source = source or YFinanceSource(interval=INTRADAY_INTERVAL)
+    limiter = TokenBucket(rate)
+    start_date = end_date - timedelta(days=days)
+    table = IntradayPrice.__table__
+    stmt = pg_insert(table).on_conflict_do_nothing(
+        index_elements=[table.c.ticker, table.c.ts]
+    ).returning(table.c.ts)
+    stats = {"inserted": 0, "failed": []}
+
+    for ticker in tickers:
+        try:
+            hist = fetch_with_retry(source, ticker, start_date, end_date, limiter)
+        except Exception as e:
+            print(f"   ❌ Erreur pour {ticker}: {str(e)}")
+            stats["failed"].append(ticker)
+            continue
+
+        if hist.empty:
+            print(f"   ⚠️  Pas de barres pour {ticker}")
+            continue
+
+        rows = intraday_to_rows(ticker, hist)
+        ensure_price_partitions(db, "intraday_prices", [row["ts"] for row in rows])
+        inserted = 0
+        for i in range(0, len(rows), batch_size):
+            # RETURNING ne renvoie que les lignes réellement insérées
+            inserted += len(db.execute(stmt, rows[i:i + batch_size]).all())
+        db.commit()
+        stats["inserted"] += inserted
+        print(f"   ✅ {ticker}: {inserted} barres ajoutées")
+
+    return stats
+
+
+def analyze_prices(table="stock_prices"):
+    """Met à jour les statistiques du planificateur après un chargement
+
+    Sur une table partitionnée, autovacuum n'analyse que les partitions :
+    les estimations de la table mère (et celles de /health) en dépendent.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"ANALYZE {table}"))
+
+
+def parse_args(argv=None):
+    """Analyse les options de la ligne de commande"""
+    parser = argparse.ArgumentParser(description="Chargement des données CAC 40")
+    parser.add_argument(
+        "--row-by-row", action="store_true",
+        help="Ancien mode : vérification et insertion ligne par ligne"
+    )
+    parser.add_argument(
+        "--update", action="store_true",
+        help="Met à jour les lignes existantes (ON CONFLICT DO UPDATE)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=FETCH_WORKERS,
+        help="Nombre de téléchargements simultanés"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=FETCH_RATE,
+        help="Débit maximal de requêtes vers Yahoo Finance (par seconde)"
+    )
+    parser.add_argument(
+        "--full", action="store_true",
+        help=f"Recharge les {HISTORY_DAYS} derniers jours pour tous les tickers "
+             "au lieu du seul historique manquant"
+    )
+    parser.add_argument(
+        "--copy", action="store_true",
+        help="Écrit chaque ticker par COPY puis fusion, sur plusieurs connexions "
+             "(base distante, ex. Neon)"
+    )
+    parser.add_argument(
+        "--connections", type=int, default=COPY_CONNECTIONS,
+        help="Connexions d'écriture simultanées en mode --copy"
+    )
+    parser.add_argument(
+        "--intraday", action="store_true",
+        help=f"Charge aussi les barres {INTRADAY_INTERVAL} des {INTRADAY_DAYS} derniers jours"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """Fonction principale"""
+    args = parse_args(argv)
+
     print("\n" + "="*60)
     print("🚀 CHARGEMENT DES DONNÉES CAC 40")
     print("="*60 + "\n")
@@ -114,6 +473,7 @@ def main():
     # Initialisation de la base de données
     print("🔧 Initialisation de la base de données...")
     init_db()
+    migrate()
     
     # Création d'une session
     db = SessionLocal()
@@ -124,20 +484,86 @@ def main():
         
         # Période de téléchargement (2 ans de données)
         end_date = datetime.now()
-        start_date = end_date - timedelta(days=730)
+        start_date = end_date - timedelta(days=HISTORY_DAYS)
         
         print(f"\n📊 Téléchargement des données historiques...")
         print(f"   Période: {start_date.date()} → {end_date.date()}\n")
         
-        # Chargement des données pour chaque entreprise
-        total_records = 0
-        for ticker in CAC40_COMPANIES.keys():
-            records = load_stock_data(db, ticker, start_date, end_date)
-            total_records += records
+        # Des agrégats déjà à jour n'ont besoin que des jours rechargés
+        rollups_current = rollups_are_current_sync(db)
+        snapshot_current = snapshot_is_current_sync(db)
+        index_current = index_is_current_sync(db)
+        
+        if args.row_by_row:
+            # Ancien mode séquentiel
+            total_records = 0
+            for ticker in CAC40_COMPANIES.keys():
+                records = load_stock_data(
+                    db, ticker, start_date, end_date,
+                    bulk=False, update=args.update
+                )
+                total_records += records
+            skipped = None
+            failed = []
+            windows = {ticker: start_date for ticker in CAC40_COMPANIES.keys()}
+        else:
+            windows = plan_refresh(
+                get_high_water_marks(db), CAC40_COMPANIES.keys(),
+                start_date, end_date, full=args.full
+            )
+            mode = "complet" if args.full else "incrémental"
+            print(f"   Mode {mode}: {len(windows)}/{len(CAC40_COMPANIES)} tickers à télécharger\n")
+
+            if args.copy:
+                # Les écritures passent par d'autres connexions : on libère
+                # la transaction de lecture de la session
+                db.commit()
+                stats = copy_load_all(
+                    engine, windows, end_date, dataframe_to_rows,
+                    workers=args.workers, connections=args.connections,
+                    rate=args.rate, update=args.update
+                )
+                print(f"\n   Débit: {stats['rows_per_sec']} lignes/s")
+                for ticker, error in stats["failed"].items():
+                    print(f"   ❌ {ticker}: {error}")
+            else:
+                stats = load_all_stock_data(
+                    db, windows, end_date,
+                    workers=args.workers, rate=args.rate, update=args.update
+                )
+            total_records = stats["inserted"]
+            skipped = stats["skipped"]
+            failed = list(stats["failed"])
+        
+        print("\n🧮 Mise à jour des agrégats...")
+        refresh_rollups(db, windows if rollups_current else None)
+        refresh_snapshot(db, windows.keys() if snapshot_current else None)
+        refresh_index_levels(db, windows if index_current else None)
+        db.commit()
+        if total_records:
+            analyze_prices()
+        
+        if args.intraday:
+            print(f"\n⏱️  Barres intrajournalières ({INTRADAY_INTERVAL}, {INTRADAY_DAYS} jours)...")
+            intraday = load_intraday_data(
+                db, CAC40_COMPANIES.keys(), end_date, rate=args.rate
+            )
+            if intraday["inserted"]:
+                analyze_prices("intraday_prices")
+            print(f"   Total: {intraday['inserted']} barres ajoutées")
+            failed = failed + intraday["failed"]
+        
+        if PRICE_STORE_DIR:
+            print("🗄️  Écriture du store de prix...")
+            write_price_store(db)
         
         print(f"\n" + "="*60)
         print(f"✅ CHARGEMENT TERMINÉ")
         print(f"   Total: {total_records} enregistrements ajoutés")
+        if skipped is not None:
+            print(f"   Ignorés (déjà présents): {skipped}")
+        if failed:
+            print(f"   Échecs: {', '.join(failed)}")
         print("="*60 + "\n")
         
     except Exception as e:
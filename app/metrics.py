@@ -0,0 +1,310 @@
+"""
+Instrumentation de l'API : latences, requêtes SQL, pool et caches.
+
+Les mesures sont tenues en mémoire dans le processus et exposées au
+format texte Prometheus par /metrics :
+
+- durée des requêtes HTTP par route (histogramme) et nombre de réponses
+  par code de statut ;
+- nombre et durée des requêtes SQL de chaque requête HTTP, comptés par les
+  événements before/after_cursor_execute du moteur ;
+- ouverture des connexions et durée d'emprunt au pool, mesurées par les
+  événements do_connect/connect et checkout/checkin, et état du pool ;
+- succès et échecs des caches enregistrés avec register_cache.
+
+Si SLOW_QUERY_MS est défini, les requêtes SQL plus longues sont journalisées
+(logger "cac40.slow_queries") avec la route qui les a émises.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Seuil du journal des requêtes lentes, en millisecondes (désactivé si vide)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS") or 0) or None
+SLOW_QUERY_MAX_CHARS = 500
+
+# Bornes des histogrammes, en secondes ou en nombre de requêtes
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+slow_query_logger = logging.getLogger("cac40.slow_queries")
+
+# Compteurs SQL de la requête HTTP en cours : {"route", "queries", "seconds"}
+current_request = ContextVar("current_request", default=None)
+
+
+class Histogram:
+    """Histogramme cumulatif à la Prometheus, une série par jeu de labels"""
+
+    def __init__(self, name, help_text, buckets, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: (list(c), s, n) for key, (c, s, n) in self._series.items()}
+
+        for label_values, (counts, total, count) in sorted(snapshot.items()):
+            base = list(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{format_labels(base + [('le', format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels(base + [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{format_labels(base)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(base)} {count}")
+        return lines
+
+
+class Counter:
+    """Compteur monotone, une valeur par jeu de labels"""
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for label_values, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{format_labels(zip(self.labels, label_values))} {format_value(value)}")
+        return lines
+
+
+def format_labels(pairs):
+    pairs = list(pairs)
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def sampled(name, help_text, samples, kind="gauge"):
+    """Lignes d'une métrique lue au moment du rendu : [(labels, valeur)]"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for pairs, value in samples:
+        lines.append(f"{name}{format_labels(pairs)} {format_value(value)}")
+    return lines
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Durée des requêtes HTTP par route",
+    LATENCY_BUCKETS, ("method", "route")
+)
+REQUESTS = Counter(
+    "http_requests_total", "Réponses HTTP par route et code de statut",
+    ("method", "route", "status")
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "Requêtes SQL émises par requête HTTP",
+    QUERY_COUNT_BUCKETS, ("route",)
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_seconds", "Temps SQL cumulé par requête HTTP",
+    LATENCY_BUCKETS, ("route",)
+)
+QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Durée des requêtes SQL", LATENCY_BUCKETS
+)
+SLOW_QUERIES = Counter(
+    "db_slow_queries_total", "Requêtes SQL au-delà de SLOW_QUERY_MS"
+)
+POOL_CONNECT = Histogram(
+    "db_pool_connect_seconds", "Ouverture d'une nouvelle connexion du pool",
+    LATENCY_BUCKETS
+)
+POOL_CHECKOUT = Histogram(
+    "db_pool_checkout_duration_seconds",
+    "Durée pendant laquelle une connexion reste empruntée au pool",
+    LATENCY_BUCKETS
+)
+
+# nom -> objet exposant hits et misses (TTLCache)
+caches = {}
+# Pools dont l'état est publié
+pools = []
+
+
+def register_cache(name, cache):
+    caches[name] = cache
+
+
+def route_name(request):
+    """Gabarit de la route (/prices/{ticker}) plutôt que le chemin réel"""
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    elapsed = time.perf_counter() - started
+    QUERY_DURATION.observe(elapsed)
+
+    stats = current_request.get()
+    if stats is not None:
+        stats["queries"] += 1
+        stats["seconds"] += elapsed
+
+    if SLOW_QUERY_MS is not None and elapsed * 1000 >= SLOW_QUERY_MS:
+        route = stats["route"] if stats is not None else "-"
+        SLOW_QUERIES.inc()
+        slow_query_logger.warning(
+            "%.1f ms [%s] %s | %s", elapsed * 1000, route,
+            " ".join(statement.split())[:SLOW_QUERY_MAX_CHARS],
+            repr(parameters)[:SLOW_QUERY_MAX_CHARS]
+        )
+
+
+def _handle_error(exception_context):
+    # Requête en échec : after_cursor_execute n'est pas appelé
+    started = exception_context.connection.info.get("query_started") \
+        if exception_context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def _do_connect(dialect, connection_record, cargs, cparams):
+    connection_record.info["connect_started"] = time.perf_counter()
+
+
+def _connect(dbapi_connection, connection_record):
+    started = connection_record.info.pop("connect_started", None)
+    if started is not None:
+        POOL_CONNECT.observe(time.perf_counter() - started)
+
+
+def _checkout(dbapi_connection, connection_record, connection_proxy):
+    connection_record.info["checked_out_at"] = time.perf_counter()
+
+
+def _checkin(dbapi_connection, connection_record):
+    started = connection_record.info.pop("checked_out_at", None)
+    if started is not None:
+        POOL_CHECKOUT.observe(time.perf_counter() - started)
+
+
+def instrument_engine(engine):
+    """Branche les compteurs SQL et les mesures du pool sur un moteur
+    synchrone (pour un moteur asynchrone : async_engine.sync_engine)"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+    # Horodatages portés par l'enregistrement de connexion du pool
+    event.listen(engine, "do_connect", _do_connect)
+    event.listen(engine, "connect", _connect)
+    event.listen(engine, "checkout", _checkout)
+    event.listen(engine, "checkin", _checkin)
+    pools.append(engine.pool)
+
+
+def install(app, engine):
+    """Ajoute le middleware de mesure à l'application FastAPI"""
+    if not METRICS_ENABLED:
+        return
+    instrument_engine(engine)
+
+    @app.middleware("http")
+    async def measure_request(request, call_next):
+        stats = {"route": request.url.path, "queries": 0, "seconds": 0.0}
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request.reset(token)
+            route = route_name(request)
+            REQUEST_DURATION.observe(elapsed, request.method, route)
+            REQUESTS.inc(request.method, route, str(status))
+            REQUEST_QUERIES.observe(stats["queries"], route)
+            REQUEST_DB_TIME.observe(stats["seconds"], route)
+
+        response.headers["Server-Timing"] = (
+            f'app;dur={elapsed * 1000:.1f}, '
+            f'db;dur={stats["seconds"] * 1000:.1f};desc="{stats["queries"]} queries"'
+        )
+        return response
+
+
+def render():
+    """Toutes les métriques au format texte Prometheus"""
+    lines = []
+    for metric in (REQUESTS, REQUEST_DURATION, REQUEST_QUERIES, REQUEST_DB_TIME,
+                   QUERY_DURATION, SLOW_QUERIES, POOL_CONNECT, POOL_CHECKOUT):
+        lines.extend(metric.render())
+
+    lines.extend(sampled(
+        "db_pool_connections", "Connexions du pool par état",
+        [
+            ([("pool", str(i)), ("state", state)], value)
+            for i, pool in enumerate(pools)
+            for state, value in (
+                ("checked_out", pool.checkedout()),
+                ("idle", pool.checkedin()),
+                ("overflow", max(0, pool.overflow())),
+            )
+        ]
+    ))
+
+    lines.extend(sampled(
+        "cache_hits_total", "Succès des caches",
+        [([("cache", name)], cache.hits) for name, cache in sorted(caches.items())],
+        kind="counter"
+    ))
+    lines.extend(sampled(
+        "cache_misses_total", "Échecs des caches",
+        [([("cache", name)], cache.misses) for name, cache in sorted(caches.items())],
+        kind="counter"
+    ))
+    lines.extend(sampled(
+        "cache_hit_ratio", "Part des lectures servies par le cache",
+        [
+            ([("cache", name)], cache.hits / (cache.hits + cache.misses))
+            for name, cache in sorted(caches.items())
+            if cache.hits + cache.misses
+        ]
+    ))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,227 @@
+"""
+Migrations idempotentes du schéma sur une base existante.
+
+init_db() ne crée que les tables absentes : les index ajoutés après coup
+au modèle, ou le passage de stock_prices en table partitionnée, doivent
+être faits ici.
+
+    python migrations.py               # index (lancé aussi par le chargeur)
+    python migrations.py --partition   # partitionnement de stock_prices
+"""
+import argparse
+
+from sqlalchemy import MetaData, text
+from database import engine, StockPrice
+from partitions import ensure_partitions, is_partitioned, list_partitions
+
+STOCK_PRICES_INDEX = "ix_stock_prices_ticker_date"
+
+# Index et contraintes remplacés par l'index composite
+LEGACY_INDEXES = ["ix_stock_prices_ticker", "idx_stock_prices_ticker"]
+LEGACY_CONSTRAINTS = ["uq_stock_prices_ticker_date", "stock_prices_ticker_date_key"]
+
+
+def _index_state(conn, name):
+    """Retourne None si l'index n'existe pas, sinon son flag indisvalid"""
+    return conn.execute(text("""
+        SELECT i.indisvalid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = :name
+    """), {"name": name}).scalar()
+
+
+def deduplicate_stock_prices(conn):
+    """Supprime les doublons (ticker, date) en gardant la ligne la plus récente"""
+    result = conn.execute(text("""
+        DELETE FROM stock_prices a
+        USING stock_prices b
+        WHERE a.ticker = b.ticker
+          AND a.date = b.date
+          AND a.id < b.id
+    """))
+    return result.rowcount
+
+
+def migrate_stock_prices_index(bind=engine):
+    """Construit l'index unique (ticker, date DESC) INCLUDE (close)
+
+    L'index est créé avec CONCURRENTLY pour ne pas bloquer les lectures ni
+    le chargement sur une base en production. Un index invalide laissé par
+    une construction interrompue est supprimé puis reconstruit.
+    """
+    # CREATE/DROP INDEX CONCURRENTLY ne peut pas tourner dans une transaction
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        # Une table partitionnée est créée avec son index (et CONCURRENTLY
+        # n'y est pas permis) : rien à faire
+        if is_partitioned(conn, "stock_prices"):
+            return
+
+        state = _index_state(conn, STOCK_PRICES_INDEX)
+
+        if state is None or state is False:
+            if state is False:
+                print(f"   ⚠️  Index {STOCK_PRICES_INDEX} invalide, reconstruction...")
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {STOCK_PRICES_INDEX}"))
+
+            removed = deduplicate_stock_prices(conn)
+            if removed:
+                print(f"   🧹 {removed} doublons supprimés dans stock_prices")
+
+            print(f"   🔨 Construction de {STOCK_PRICES_INDEX}...")
+            conn.execute(text(f"""
+                CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {STOCK_PRICES_INDEX}
+                ON stock_prices (ticker, date DESC) INCLUDE (close)
+            """))
+
+        # Le nouvel index sert d'arbitre à ON CONFLICT : on peut retirer les anciens
+        for constraint in LEGACY_CONSTRAINTS:
+            conn.execute(text(
+                f"ALTER TABLE stock_prices DROP CONSTRAINT IF EXISTS {constraint}"
+            ))
+        for index in LEGACY_INDEXES:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index}"))
+
+
+LEGACY_TABLE = "stock_prices_unpartitioned"
+PARTITIONED_TABLE = "stock_prices_partitioned"
+COPY_COLUMNS = "ticker, date, open, high, low, close, volume, adj_close"
+
+# Index de la table ordinaire renommés pour libérer les noms du modèle
+MODEL_INDEXES = [STOCK_PRICES_INDEX, "ix_stock_prices_date"]
+
+CATCH_UP_SQL = text(f"""
+    INSERT INTO {PARTITIONED_TABLE} ({COPY_COLUMNS})
+    SELECT {COPY_COLUMNS} FROM stock_prices
+    ON CONFLICT (ticker, date) DO UPDATE SET
+    {", ".join(f"{c} = EXCLUDED.{c}" for c in COPY_COLUMNS.split(", ")[2:])}
+    WHERE ({PARTITIONED_TABLE}.open, {PARTITIONED_TABLE}.high, {PARTITIONED_TABLE}.low,
+           {PARTITIONED_TABLE}.close, {PARTITIONED_TABLE}.volume, {PARTITIONED_TABLE}.adj_close)
+          IS DISTINCT FROM
+          (EXCLUDED.open, EXCLUDED.high, EXCLUDED.low,
+           EXCLUDED.close, EXCLUDED.volume, EXCLUDED.adj_close)
+""")
+
+# Lignes supprimées de stock_prices après leur copie
+PRUNE_SQL = text(f"""
+    DELETE FROM {PARTITIONED_TABLE} p
+    WHERE NOT EXISTS (
+        SELECT 1 FROM stock_prices s
+        WHERE s.ticker = p.ticker AND s.date = p.date
+    )
+""")
+
+
+def partitioning_pending(bind=engine):
+    """Vrai si stock_prices est encore une table ordinaire"""
+    with bind.connect() as conn:
+        kind = conn.execute(text(
+            "SELECT relkind FROM pg_class WHERE oid = to_regclass('stock_prices')"
+        )).scalar()
+    return kind == "r"
+
+
+def _table_indexes(conn, table):
+    return {name for (name,) in conn.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE tablename = :table"
+    ), {"table": table})}
+
+
+def migrate_stock_prices_partitioning(bind=engine):
+    """Convertit une table stock_prices ordinaire en table partitionnée
+
+    Étape explicite (python migrations.py --partition), jamais lancée par
+    le chargeur. La table partitionnée est construite à côté, sous le nom
+    stock_prices_partitioned, puis remplie année par année, chaque année
+    dans sa propre transaction : lectures et écritures continuent sur
+    stock_prices pendant la copie. La bascule finale bloque les seules
+    écritures (verrou EXCLUSIVE) le temps de reprendre les lignes
+    ajoutées, modifiées ou supprimées entre-temps, puis échange les noms. Interrompue,
+    la migration reprend là où elle s'était arrêtée.
+    """
+    if not partitioning_pending(bind):
+        print("   ✅ stock_prices est déjà partitionnée")
+        return
+
+    with bind.begin() as conn:
+        # Index du modèle portés par l'ancienne table : renommés (rapide)
+        for index in sorted(_table_indexes(conn, "stock_prices") & set(MODEL_INDEXES)):
+            conn.execute(text(f"ALTER INDEX {index} RENAME TO {index}_legacy"))
+
+        partitioned = StockPrice.__table__.to_metadata(MetaData(), name=PARTITIONED_TABLE)
+        partitioned.create(conn, checkfirst=True)
+        first, last = conn.execute(text(
+            "SELECT min(date), max(date) FROM stock_prices"
+        )).one()
+        if first is not None:
+            created = ensure_partitions(
+                conn, "stock_prices", first, last, parent=PARTITIONED_TABLE
+            )
+            print(f"   📦 {len(created)} partitions créées ({first.year} → {last.year})")
+
+    copied = 0
+    if first is not None:
+        with bind.connect() as conn:
+            partitions = list_partitions(conn, PARTITIONED_TABLE)
+        for name, lower, upper in partitions:
+            with bind.begin() as conn:
+                rows = conn.execute(text(f"""
+                    INSERT INTO {PARTITIONED_TABLE} ({COPY_COLUMNS})
+                    SELECT {COPY_COLUMNS} FROM stock_prices
+                    WHERE date >= :lower AND date < :upper
+                    ON CONFLICT (ticker, date) DO NOTHING
+                """), {"lower": lower, "upper": upper}).rowcount
+            copied += rows
+            print(f"   📥 {name}: {rows} lignes copiées")
+
+    print("   🔀 Bascule (écritures suspendues)...")
+    with bind.begin() as conn:
+        conn.execute(text("LOCK TABLE stock_prices IN EXCLUSIVE MODE"))
+        last = conn.execute(text("SELECT max(date) FROM stock_prices")).scalar()
+        if last is not None:
+            ensure_partitions(conn, "stock_prices", last, last, parent=PARTITIONED_TABLE)
+        caught_up = conn.execute(CATCH_UP_SQL).rowcount
+        caught_up += conn.execute(PRUNE_SQL).rowcount
+        conn.execute(text(f"ALTER TABLE stock_prices RENAME TO {LEGACY_TABLE}"))
+        conn.execute(text(f"ALTER TABLE {PARTITIONED_TABLE} RENAME TO stock_prices"))
+        conn.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
+        # Index nommés d'après la table temporaire : on reprend les noms du modèle
+        for index in sorted(_table_indexes(conn, "stock_prices")):
+            if index.startswith(f"ix_{PARTITIONED_TABLE}_"):
+                model_name = index.replace(PARTITIONED_TABLE, "stock_prices", 1)
+                conn.execute(text(f"ALTER INDEX {index} RENAME TO {model_name}"))
+    print(f"   ✅ {copied} lignes copiées, {caught_up} reprises à la bascule")
+
+    # Statistiques du planificateur et estimations de /health
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE stock_prices"))
+
+
+def migrate(bind=engine):
+    """Migrations rapides et idempotentes, lancées par le chargeur
+
+    Le partitionnement de stock_prices, qui recopie toute la table, n'en
+    fait pas partie : il est seulement signalé.
+    """
+    migrate_stock_prices_index(bind)
+    if partitioning_pending(bind):
+        print("   ⚠️  stock_prices n'est pas partitionnée : "
+              "python migrations.py --partition (hors des heures de chargement)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Migrations du schéma")
+    parser.add_argument("--partition", action="store_true",
+                        help="Convertit stock_prices en table partitionnée (copie par année)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print("🔧 Migration du schéma...")
+    migrate()
+    if args.partition:
+        # Dédoublonnage et index unique faits par migrate() : la copie ne
+        # rencontre pas de doublons
+        migrate_stock_prices_partitioning()
+    print("✅ Schéma à jour")
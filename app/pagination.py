@@ -0,0 +1,122 @@
+"""
+Pagination par clé (keyset) et flux NDJSON pour /prices.
+
+Le curseur opaque encode le couple (ticker, date) de la dernière ligne
+renvoyée ; la page suivante reprend par WHERE date < :date sur l'index
+(ticker, date DESC), à coût constant quelle que soit la profondeur.
+"""
+import base64
+import json
+from datetime import date, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import desc, select
+
+from async_database import AsyncSessionLocal
+from database import StockPrice
+from serialization import dumps
+
+# Lignes lues par aller-retour du curseur serveur en mode flux
+STREAM_CHUNK_ROWS = 1000
+
+PRICE_COLUMNS = ("ticker", "date", "open", "high", "low", "close", "volume")
+
+# Marge en jours ajoutée à la fenêtre d'une page (jours fériés, trous)
+PAGE_FLOOR_MARGIN_DAYS = 15
+
+
+def encode_cursor(ticker, day):
+    payload = json.dumps({"t": ticker, "d": day.isoformat()}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, ticker):
+    """Retourne la date du curseur ou lève une 400 s'il est invalide"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        cursor_ticker, day = payload["t"], date.fromisoformat(payload["d"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+
+    if cursor_ticker != ticker:
+        raise HTTPException(status_code=400, detail="Curseur d'un autre ticker")
+    return day
+
+
+def next_page_headers(request, ticker, dates, limit):
+    """En-têtes X-Next-Cursor et Link si une page suivante peut exister
+
+    dates : dates de la page renvoyée, dans l'ordre de la réponse.
+    """
+    if not dates or len(dates) < limit:
+        return {}
+
+    cursor = encode_cursor(ticker, dates[-1])
+    next_url = request.url.include_query_params(cursor=cursor)
+    return {"X-Next-Cursor": cursor, "Link": f'<{next_url}>; rel="next"'}
+
+
+def rows_to_records(rows):
+    """Lignes (tuples dans l'ordre de PRICE_COLUMNS) -> dicts"""
+    return [dict(zip(PRICE_COLUMNS, row)) for row in rows]
+
+
+def rows_to_columns(ticker, rows):
+    """Lignes -> {"ticker": ..., colonne: [valeurs]} (format columns)"""
+    columns = list(zip(*rows)) if rows else [()] * len(PRICE_COLUMNS)
+    return {
+        "ticker": ticker,
+        **{name: list(values) for name, values in zip(PRICE_COLUMNS[1:], columns[1:])},
+    }
+
+
+def price_range_query(ticker, start_date=None, end_date=None, before=None):
+    """Colonnes de /prices pour un ticker, par date décroissante"""
+    query = select(*(getattr(StockPrice, c) for c in PRICE_COLUMNS))\
+        .where(StockPrice.ticker == ticker)
+
+    if start_date:
+        query = query.where(StockPrice.date >= start_date)
+    if end_date:
+        query = query.where(StockPrice.date <= end_date)
+    if before:
+        query = query.where(StockPrice.date < before)
+
+    return query.order_by(desc(StockPrice.date))
+
+
+def page_floor(anchor, limit):
+    """Date de début d'une fenêtre couvrant limit séances jusqu'à anchor"""
+    return anchor - timedelta(days=limit * 7 // 5 + PAGE_FLOOR_MARGIN_DAYS)
+
+
+async def fetch_page(db, query, limit, anchor=None):
+    """Lit une page de query (date décroissante) sans date de début
+
+    Sans borne basse, le planificateur parcourt toutes les partitions de
+    stock_prices. La page est d'abord lue sur la fenêtre qui finit à
+    anchor (dernière date connue) ; si elle contient moins de limit
+    lignes, la requête est relancée sans borne.
+    """
+    if anchor is not None:
+        rows = (await db.execute(
+            query.where(StockPrice.date >= page_floor(anchor, limit)).limit(limit)
+        )).all()
+        if len(rows) == limit:
+            return rows
+    return (await db.execute(query.limit(limit))).all()
+
+
+async def iter_ndjson(query):
+    """Produit les lignes en NDJSON depuis un curseur serveur
+
+    La session est ouverte dans le générateur : elle vit aussi longtemps
+    que le flux, indépendamment des dépendances de la requête.
+    """
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(
+            query.execution_options(yield_per=STREAM_CHUNK_ROWS)
+        )
+        async for rows in result.partitions():
+            yield b"".join(dumps(row._asdict()) + b"\n" for row in rows)
@@ -0,0 +1,101 @@
+"""
+Chargement du panel date × ticker des clôtures.
+
+Une seule requête ramène (date, ticker, close) pour tous les tickers
+demandés ; le résultat est pivoté en un tableau NumPy float64 contigu
+(lignes = dates, colonnes = tickers, NaN si pas de cotation) sur lequel
+les calculs transverses (corrélations, indices, backtests) sont vectorisés.
+Si un store de prix à jour est fourni, les clôtures y sont lues sans
+passer par la base.
+"""
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from database import StockPrice
+from price_store import to_dates
+
+
+class PricePanel:
+    """Clôtures alignées : dates (n), tickers (m), values (n × m)"""
+
+    def __init__(self, dates, tickers, values):
+        self.dates = dates
+        self.tickers = tickers
+        self.values = values
+
+    @property
+    def empty(self):
+        return self.values.size == 0
+
+    def returns(self):
+        """Rendements simples quotidiens (n - 1 × m), NaN si une clôture manque"""
+        values = self.values
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return values[1:] / values[:-1] - 1
+
+
+def close_frame_from_store(store, tickers, start_date=None, end_date=None):
+    """Clôtures (date × ticker) lues dans les colonnes mappées du store"""
+    series = {}
+    for ticker in tickers:
+        columns = store.columns(ticker, start_date, end_date)
+        if len(columns["date"]):
+            series[ticker] = pd.Series(
+                np.asarray(columns["close"]), index=to_dates(columns["date"])
+            )
+    return pd.DataFrame(series).sort_index()
+
+
+def close_query(tickers=None, start_date=None, end_date=None):
+    """SELECT (date, ticker, close) des tickers et de la période demandés"""
+    query = select(StockPrice.date, StockPrice.ticker, StockPrice.close)
+    if tickers:
+        query = query.where(StockPrice.ticker.in_(tickers))
+    if start_date:
+        query = query.where(StockPrice.date >= start_date)
+    if end_date:
+        query = query.where(StockPrice.date <= end_date)
+    return query
+
+
+def panel_from_rows(rows, tickers=None):
+    """Lignes (date, ticker, close) -> PricePanel"""
+    if not rows:
+        return PricePanel([], list(tickers or []), np.empty((0, len(tickers or []))))
+
+    frame = pd.DataFrame(rows, columns=["date", "ticker", "close"])\
+        .pivot(index="date", columns="ticker", values="close")\
+        .sort_index()
+    return panel_from_frame(frame, tickers)
+
+
+async def load_close_panel(db, tickers=None, start_date=None, end_date=None, store=None):
+    """Charge les clôtures en un PricePanel (tous les tickers par défaut)"""
+    if store is not None:
+        frame = close_frame_from_store(
+            store, tickers or store.tickers(), start_date, end_date
+        )
+        if frame.empty:
+            return PricePanel([], list(tickers or []), np.empty((0, len(tickers or []))))
+        return panel_from_frame(frame, tickers)
+
+    rows = (await db.execute(close_query(tickers, start_date, end_date))).all()
+    return panel_from_rows(rows, tickers)
+
+
+def load_close_panel_sync(db, tickers=None, start_date=None, end_date=None):
+    """Équivalent synchrone de load_close_panel (chargeur), sans store"""
+    rows = db.execute(close_query(tickers, start_date, end_date)).all()
+    return panel_from_rows(rows, tickers)
+
+
+def panel_from_frame(frame, tickers=None):
+    """DataFrame date × ticker -> PricePanel (colonnes triées)"""
+    if tickers:
+        frame = frame.reindex(columns=sorted(set(tickers)))
+    else:
+        frame = frame.reindex(columns=sorted(frame.columns))
+
+    values = np.ascontiguousarray(frame.to_numpy(dtype=np.float64))
+    return PricePanel(list(frame.index), list(frame.columns), values)
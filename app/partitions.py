@@ -0,0 +1,165 @@
+"""
+Partitions par plage de dates des tables de prix.
+
+stock_prices est partitionnée par année et intraday_prices par mois. Le
+chargeur crée les partitions manquantes avant d'écrire (ensure_partitions),
+si bien qu'aucune partition par défaut n'est nécessaire. Les requêtes
+bornées en date ne lisent que les partitions concernées : la latence des
+fenêtres récentes ne dépend pas de la profondeur de l'historique.
+
+Les partitions anciennes peuvent être détachées (elles restent des tables
+ordinaires, hors des requêtes de l'API) et, au besoin, archivées en
+Parquet compressé puis supprimées :
+
+    python partitions.py                                  # liste
+    python partitions.py --detach-before 2010-01-01       # détache
+    python partitions.py --detach-before 2010-01-01 --archive /archives
+"""
+import argparse
+import os
+import re
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import text
+
+from database import engine, bump_data_version
+
+# table -> (colonne de partitionnement, granularité)
+PARTITIONED_TABLES = {
+    "stock_prices": ("date", "year"),
+    "intraday_prices": ("ts", "month"),
+}
+
+BOUND_PATTERN = re.compile(r"FROM \('([0-9-]{10})[^']*'\) TO \('([0-9-]{10})[^']*'\)")
+
+
+def partition_range(granularity, day):
+    """(début inclus, fin exclue, suffixe) de la partition contenant day"""
+    if granularity == "year":
+        return date(day.year, 1, 1), date(day.year + 1, 1, 1), f"y{day.year}"
+    start = date(day.year, day.month, 1)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end, f"y{day.year}m{day.month:02d}"
+
+
+def list_partitions(conn, table):
+    """[(nom, début, fin)] des partitions attachées, par date croissante"""
+    rows = conn.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:table)
+    """), {"table": table}).all()
+
+    partitions = []
+    for name, bound in rows:
+        match = BOUND_PATTERN.search(bound or "")
+        if match:
+            partitions.append((
+                name, date.fromisoformat(match.group(1)), date.fromisoformat(match.group(2))
+            ))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def is_partitioned(conn, table):
+    return conn.execute(text(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)"
+    ), {"table": table}).scalar() or False
+
+
+def ensure_partitions(conn, table, start, end, parent=None):
+    """Crée les partitions couvrant [start, end] ; retourne les noms créés
+
+    Seules les partitions absentes sont créées : en régime établi, la
+    fonction ne fait qu'une lecture du catalogue et ne prend aucun verrou
+    sur la table mère. parent désigne la table mère si elle ne porte pas
+    encore le nom table (migration) ; les partitions gardent le préfixe
+    table. Sans effet sur une table non partitionnée (base pas encore
+    migrée).
+    """
+    _, granularity = PARTITIONED_TABLES[table]
+    parent = parent or table
+    if not is_partitioned(conn, parent):
+        return []
+    if isinstance(start, datetime):
+        start = start.date()
+    if isinstance(end, datetime):
+        end = end.date()
+
+    existing = {name for name, _, _ in list_partitions(conn, parent)}
+    created = []
+    day = start
+    while day <= end:
+        lower, upper, suffix = partition_range(granularity, day)
+        name = f"{table}_{suffix}"
+        if name not in existing:
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {parent} "
+                f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+            ))
+            created.append(name)
+        day = upper
+    return created
+
+
+def detach_partitions(conn, table, before):
+    """Détache les partitions entièrement antérieures à before
+
+    Les tables restent en base, renommées avec le suffixe _detached pour
+    qu'ensure_partitions puisse recréer une partition vide au même nom.
+    Retourne les nouveaux noms.
+    """
+    detached = []
+    for name, _, upper in list_partitions(conn, table):
+        if upper <= before:
+            conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            conn.execute(text(f"ALTER TABLE {name} RENAME TO {name}_detached"))
+            detached.append(f"{name}_detached")
+    return detached
+
+
+def archive_table(conn, name, directory):
+    """Exporte une table détachée en Parquet (zstd) puis la supprime"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.parquet")
+    frame = pd.read_sql(text(f"SELECT * FROM {name}"), conn)
+    frame.to_parquet(path, compression="zstd", index=False)
+    conn.execute(text(f"DROP TABLE {name}"))
+    return path, len(frame)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Partitions des tables de prix")
+    parser.add_argument("--table", choices=list(PARTITIONED_TABLES), default="stock_prices")
+    parser.add_argument("--detach-before", type=date.fromisoformat,
+                        help="Détache les partitions antérieures à cette date (AAAA-MM-JJ)")
+    parser.add_argument("--archive", metavar="DOSSIER",
+                        help="Archive les partitions détachées en Parquet puis les supprime")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    with engine.begin() as conn:
+        if args.detach_before is None:
+            print(f"📦 Partitions de {args.table} :")
+            for name, lower, upper in list_partitions(conn, args.table):
+                print(f"   {name:32s} {lower} → {upper}")
+            return
+
+        detached = detach_partitions(conn, args.table, args.detach_before)
+        if detached:
+            # Les données visibles changent : invalide caches, agrégats et store
+            bump_data_version(conn)
+        print(f"✂️  {len(detached)} partition(s) détachée(s): {', '.join(detached) or '-'}")
+
+        if args.archive:
+            for name in detached:
+                path, rows = archive_table(conn, name, args.archive)
+                print(f"   🗜️  {name}: {rows} lignes → {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Copie locale de stock_prices en fichiers colonnaires mappés en mémoire.
+
+Le chargeur écrit, après chaque ingestion, un répertoire contenant un
+tableau .npy contigu par colonne (dates en jours depuis l'epoch, prix et
+volumes en float64), triés par (ticker, date), et un index JSON des
+plages [début, fin) de chaque ticker. Le fichier CURRENT désigne le
+répertoire actif ; il est remplacé atomiquement (os.replace), si bien
+qu'un lecteur voit toujours un jeu complet.
+
+L'API ouvre les colonnes avec numpy.memmap (np.load(mmap_mode="r")) et
+ne s'en sert que si leur version correspond à la version des données en
+base ; sinon elle retombe sur PostgreSQL. Activé par PRICE_STORE_DIR.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from database import SessionLocal, StockPrice, get_data_version
+
+PRICE_STORE_DIR = os.getenv("PRICE_STORE_DIR")
+# Intervalle minimal entre deux vérifications de CURRENT par l'API
+PRICE_STORE_CHECK_SECONDS = float(os.getenv("PRICE_STORE_CHECK_SECONDS", "5"))
+
+VALUE_COLUMNS = ("open", "high", "low", "close", "volume", "adj_close")
+POINTER = "CURRENT"
+# Répertoires conservés : l'actif et le précédent (encore mappé par des lecteurs)
+KEEP_STORES = 2
+
+
+def to_days(values):
+    """Dates -> int32 (jours depuis 1970-01-01)"""
+    return pd.to_datetime(values).values.astype("datetime64[D]").astype(np.int32)
+
+
+def write_price_store(db, directory=PRICE_STORE_DIR):
+    """Exporte stock_prices vers un nouveau répertoire puis l'active
+
+    Retourne le chemin du répertoire écrit, ou None si le store est désactivé.
+    """
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+
+    version = get_data_version(db)
+    columns = [StockPrice.ticker, StockPrice.date] + [getattr(StockPrice, c) for c in VALUE_COLUMNS]
+    frame = pd.read_sql(
+        select(*columns).order_by(StockPrice.ticker, StockPrice.date),
+        db.connection()
+    )
+
+    name = f"store-{version}-{int(time.time() * 1000)}"
+    target = os.path.join(directory, name)
+    os.makedirs(target)
+
+    np.save(os.path.join(target, "date.npy"), to_days(frame["date"]))
+    for column in VALUE_COLUMNS:
+        np.save(
+            os.path.join(target, f"{column}.npy"),
+            np.ascontiguousarray(frame[column].to_numpy(dtype=np.float64))
+        )
+
+    # Plages [début, fin) de chaque ticker dans les colonnes
+    tickers = frame["ticker"].to_numpy()
+    bounds = np.flatnonzero(tickers[1:] != tickers[:-1]) + 1
+    starts = np.concatenate([[0], bounds]) if len(tickers) else np.array([], dtype=int)
+    ends = np.concatenate([bounds, [len(tickers)]]) if len(tickers) else np.array([], dtype=int)
+    index = {
+        str(tickers[start]): [int(start), int(end)] for start, end in zip(starts, ends)
+    }
+
+    with open(os.path.join(target, "index.json"), "w") as f:
+        json.dump({"version": version, "rows": len(frame), "tickers": index}, f)
+
+    # Bascule atomique du pointeur
+    pointer_tmp = os.path.join(directory, POINTER + ".tmp")
+    with open(pointer_tmp, "w") as f:
+        f.write(name)
+    os.replace(pointer_tmp, os.path.join(directory, POINTER))
+
+    _prune(directory, name)
+    return target
+
+
+def _prune(directory, current):
+    stores = sorted(
+        (d for d in os.listdir(directory) if d.startswith("store-") and d != current),
+        key=lambda d: os.path.getmtime(os.path.join(directory, d))
+    )
+    for old in stores[:max(0, len(stores) - (KEEP_STORES - 1))]:
+        shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+
+
+class PriceStore:
+    """Lecteur du store : colonnes mappées et index des tickers"""
+
+    def __init__(self, directory=PRICE_STORE_DIR, check_every=PRICE_STORE_CHECK_SECONDS):
+        self.directory = directory
+        self.check_every = check_every
+        self.version = None
+        self._name = None
+        self._columns = {}
+        self._index = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.directory)
+
+    def _refresh(self):
+        """Rouvre le store si CURRENT désigne un nouveau répertoire"""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_every:
+            return
+        self._checked_at = now
+
+        try:
+            with open(os.path.join(self.directory, POINTER)) as f:
+                name = f.read().strip()
+        except OSError:
+            return
+        if name == self._name:
+            return
+
+        path = os.path.join(self.directory, name)
+        try:
+            with open(os.path.join(path, "index.json")) as f:
+                meta = json.load(f)
+            columns = {
+                column: np.load(os.path.join(path, f"{column}.npy"), mmap_mode="r")
+                for column in ("date",) + VALUE_COLUMNS
+            }
+        except (OSError, ValueError):
+            return
+
+        with self._lock:
+            self._name = name
+            self._columns = columns
+            self._index = meta["tickers"]
+            self.version = meta["version"]
+
+    def is_current(self, data_version):
+        """Vrai si le store est activé et reflète data_version"""
+        if not self.enabled:
+            return False
+        self._refresh()
+        return self.version is not None and self.version == data_version
+
+    def tickers(self):
+        return list(self._index)
+
+    def columns(self, ticker, start_date=None, end_date=None, before=None):
+        """Vues (sans copie) des colonnes d'un ticker, dates croissantes
+
+        Retourne un dict {colonne: tableau} ; les bornes sont appliquées par
+        recherche dichotomique sur la colonne date.
+        """
+        with self._lock:
+            columns, bounds = self._columns, self._index.get(ticker)
+
+        if bounds is None:
+            return {column: np.empty(0) for column in ("date",) + VALUE_COLUMNS}
+
+        start, end = bounds
+        days = columns["date"][start:end]
+        lo, hi = 0, len(days)
+        if start_date:
+            lo = int(np.searchsorted(days, to_days([start_date])[0], side="left"))
+        if end_date:
+            hi = int(np.searchsorted(days, to_days([end_date])[0], side="right"))
+        if before:
+            hi = min(hi, int(np.searchsorted(days, to_days([before])[0], side="left")))
+        hi = max(lo, hi)
+
+        return {
+            column: values[start + lo:start + hi]
+            for column, values in columns.items()
+        }
+
+
+def to_dates(days):
+    """int32 (jours depuis l'epoch) -> tableau d'objets datetime.date"""
+    return np.asarray(days).astype("datetime64[D]").astype(object)
+
+
+def rows_from_columns(ticker, columns, limit=None, descending=True):
+    """Colonnes du store -> dicts au format StockPriceResponse"""
+    step = -1 if descending else 1
+    chosen = {
+        column: columns[column][::step][:limit]
+        for column in ("open", "high", "low", "close", "volume")
+    }
+    dates = to_dates(columns["date"][::step][:limit])
+    values = zip(*(chosen[c].tolist() for c in chosen))
+    return [
+        {"ticker": ticker, "date": day, **dict(zip(chosen, row))}
+        for day, row in zip(dates, values)
+    ]
+
+
+def columns_payload(ticker, columns, limit=None, descending=True):
+    """Colonnes du store -> {"ticker": ..., colonne: [valeurs]} (format columns)"""
+    step = -1 if descending else 1
+    return {
+        "ticker": ticker,
+        "date": to_dates(columns["date"][::step][:limit]).tolist(),
+        **{
+            column: columns[column][::step][:limit].tolist()
+            for column in ("open", "high", "low", "close", "volume")
+        },
+    }
+
+
+def frame_from_columns(columns, names=("open", "high", "low", "close", "volume")):
+    """Colonnes du store -> DataFrame indexé par date (comme prices_frame)"""
+    return pd.DataFrame(
+        {name: np.asarray(columns[name]) for name in names},
+        index=pd.Index(to_dates(columns["date"]), name="date")
+    )
+
+
+price_store = PriceStore()
+
+
+if __name__ == "__main__":
+    print("🗄️  Reconstruction du store de prix...")
+    db = SessionLocal()
+    try:
+        path = write_price_store(db)
+    finally:
+        db.close()
+    print(f"✅ Store écrit dans {path}" if path else "⚠️  PRICE_STORE_DIR non défini")
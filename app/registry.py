@@ -0,0 +1,75 @@
+"""
+Référentiel des entreprises gardé en mémoire par l'API.
+
+La table companies est minuscule et ne change qu'au passage du chargeur,
+qui incrémente alors la version des données. Le registre est chargé au
+démarrage puis rechargé dès que cette version change ; il sert à valider
+les tickers (404), à retrouver nom et secteur et à répondre à /companies
+et /sectors sans requête supplémentaire.
+"""
+import asyncio
+
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from cache import response_cache
+from database import Company
+
+
+class TickerRegistry:
+    """Entreprises indexées par ticker, à la version des données près"""
+
+    def __init__(self):
+        self.version = None
+        self._companies = {}
+        self._lock = asyncio.Lock()
+
+    async def load(self, db, version):
+        rows = (await db.execute(
+            select(Company.ticker, Company.name, Company.sector).order_by(Company.id)
+        )).all()
+        self._companies = {
+            row.ticker: {"ticker": row.ticker, "name": row.name, "sector": row.sector}
+            for row in rows
+        }
+        self.version = version
+
+    async def ensure_current(self, db):
+        """Recharge le registre si la version des données a changé
+
+        La version est celle du cache de réponses, relue en base au plus
+        toutes les CACHE_VERSION_CHECK_SECONDS secondes.
+        """
+        version = await response_cache.data_version(db)
+        if version == self.version:
+            return
+        async with self._lock:
+            if version != self.version:
+                await self.load(db, version)
+
+    async def require(self, db, ticker):
+        """Retourne l'entreprise ou lève une 404"""
+        await self.ensure_current(db)
+        company = self._companies.get(ticker)
+        if company is None:
+            raise HTTPException(status_code=404, detail="Ticker non trouvé")
+        return company
+
+    async def unknown(self, db, tickers):
+        """Tickers absents du référentiel"""
+        await self.ensure_current(db)
+        return sorted(set(tickers) - self._companies.keys())
+
+    async def companies(self, db, sector=None):
+        await self.ensure_current(db)
+        return [
+            company for company in self._companies.values()
+            if sector is None or company["sector"] == sector
+        ]
+
+    async def sectors(self, db):
+        await self.ensure_current(db)
+        return sorted({company["sector"] for company in self._companies.values()})
+
+
+ticker_registry = TickerRegistry()
@@ -0,0 +1,154 @@
+"""
+Agrégats précalculés pour /statistics.
+
+Pour chaque ticker, price_rollups stocke les sommes cumulées des clôtures,
+des volumes et du nombre de lignes à chaque date : la moyenne, la somme et
+le comptage d'une fenêtre [cutoff, dernière date] se lisent comme la
+différence de deux lignes. price_monthly_blocks stocke le min/max de
+clôture de chaque mois : le min/max d'une fenêtre combine les mois
+complets et les quelques jours du premier mois partiel.
+
+Le chargeur les met à jour après chaque ingestion puis aligne la version
+"rollup" sur la version "prices" ; tant que les deux diffèrent, l'API
+revient au calcul direct sur stock_prices.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import desc, func, literal, select, text, union_all
+
+from async_database import versions_match_async
+from database import (
+    PriceMonthlyBlock, PriceRollup, StockPrice, sync_data_version, versions_match
+)
+
+ROLLUP_VERSION = "rollup"
+
+REFRESH_CUMULATIVE_SQL = text("""
+    INSERT INTO price_rollups (ticker, date, cum_close, cum_volume, cum_count)
+    SELECT p.ticker,
+           p.date,
+           COALESCE(b.cum_close, 0) + SUM(COALESCE(p.close, 0)) OVER w,
+           COALESCE(b.cum_volume, 0) + SUM(COALESCE(p.volume, 0)) OVER w,
+           COALESCE(b.cum_count, 0) + COUNT(*) OVER w
+    FROM stock_prices p
+    LEFT JOIN LATERAL (
+        SELECT cum_close, cum_volume, cum_count
+        FROM price_rollups
+        WHERE ticker = :ticker AND date < :since
+        ORDER BY date DESC
+        LIMIT 1
+    ) b ON true
+    WHERE p.ticker = :ticker AND p.date >= :since
+    WINDOW w AS (ORDER BY p.date ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)
+""")
+
+REFRESH_MONTHLY_SQL = text("""
+    INSERT INTO price_monthly_blocks (ticker, month, min_close, max_close)
+    SELECT ticker, date_trunc('month', date)::date, MIN(close), MAX(close)
+    FROM stock_prices
+    WHERE ticker = :ticker AND date >= :month_start
+    GROUP BY ticker, date_trunc('month', date)
+    ON CONFLICT (ticker, month) DO UPDATE
+    SET min_close = EXCLUDED.min_close, max_close = EXCLUDED.max_close
+""")
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month_start(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def refresh_rollups(db, since_by_ticker=None):
+    """Recalcule les agrégats à partir de la date indiquée pour chaque ticker
+
+    since_by_ticker associe un ticker à la première date modifiée (date ou
+    datetime). Avec None, tout est reconstruit. Ne committe pas.
+    """
+    if since_by_ticker is None:
+        rows = db.query(StockPrice.ticker, func.min(StockPrice.date))\
+            .group_by(StockPrice.ticker).all()
+        since_by_ticker = dict(rows)
+        db.query(PriceRollup).delete()
+        db.query(PriceMonthlyBlock).delete()
+
+    for ticker, since in since_by_ticker.items():
+        if isinstance(since, datetime):
+            since = since.date()
+
+        db.query(PriceRollup).filter(
+            PriceRollup.ticker == ticker, PriceRollup.date >= since
+        ).delete()
+        db.execute(REFRESH_CUMULATIVE_SQL, {"ticker": ticker, "since": since})
+        db.execute(REFRESH_MONTHLY_SQL, {"ticker": ticker, "month_start": month_start(since)})
+
+    sync_data_version(db, ROLLUP_VERSION)
+
+
+def rollups_are_current_sync(db):
+    """Vrai si les agrégats reflètent la dernière écriture du chargeur"""
+    return versions_match(db, ROLLUP_VERSION)
+
+
+async def rollups_are_current(db):
+    """Équivalent asynchrone de rollups_are_current_sync"""
+    return await versions_match_async(db, ROLLUP_VERSION)
+
+
+async def rollup_statistics(db, ticker, cutoff_date):
+    """Statistiques de [cutoff_date, dernière date] lues dans les agrégats
+
+    Retourne un dict (avg_close, min_close, max_close, total_volume,
+    record_count) avec des valeurs nulles si la fenêtre est vide.
+    """
+    last = select(PriceRollup.cum_close, PriceRollup.cum_volume, PriceRollup.cum_count)\
+        .where(PriceRollup.ticker == ticker)\
+        .order_by(desc(PriceRollup.date))\
+        .limit(1)\
+        .subquery()
+
+    base = select(PriceRollup.cum_close, PriceRollup.cum_volume, PriceRollup.cum_count)\
+        .where(PriceRollup.ticker == ticker, PriceRollup.date < cutoff_date)\
+        .order_by(desc(PriceRollup.date))\
+        .limit(1)\
+        .subquery()
+
+    sums = (await db.execute(
+        select(
+            (last.c.cum_close - func.coalesce(base.c.cum_close, 0)).label("sum_close"),
+            (last.c.cum_volume - func.coalesce(base.c.cum_volume, 0)).label("total_volume"),
+            (last.c.cum_count - func.coalesce(base.c.cum_count, 0)).label("record_count")
+        ).select_from(last).outerjoin(base, literal(True))
+    )).first()
+
+    # Mois entièrement inclus dans la fenêtre + jours du premier mois partiel
+    full_months = select(
+        PriceMonthlyBlock.min_close.label("min_close"),
+        PriceMonthlyBlock.max_close.label("max_close")
+    ).where(
+        PriceMonthlyBlock.ticker == ticker,
+        PriceMonthlyBlock.month >= cutoff_date
+    )
+    partial_month = select(
+        func.min(StockPrice.close).label("min_close"),
+        func.max(StockPrice.close).label("max_close")
+    ).where(
+        StockPrice.ticker == ticker,
+        StockPrice.date >= cutoff_date,
+        StockPrice.date < next_month_start(cutoff_date)
+    )
+    blocks = union_all(full_months, partial_month).subquery()
+    extremes = (await db.execute(
+        select(func.min(blocks.c.min_close), func.max(blocks.c.max_close))
+    )).first()
+
+    count = int(sums.record_count) if sums and sums.record_count else 0
+    return {
+        "avg_close": float(sums.sum_close) / count if count else 0,
+        "min_close": float(extremes[0]) if count and extremes[0] is not None else 0,
+        "max_close": float(extremes[1]) if count and extremes[1] is not None else 0,
+        "total_volume": float(sums.total_volume) if count else 0,
+        "record_count": count
+    }
@@ -0,0 +1,31 @@
+"""
+Sérialisation JSON des réponses de l'API.
+
+Par défaut, les réponses passent par jsonable_encoder et le module json.
+Avec FAST_JSON=true et orjson installé, elles sont encodées directement
+en UTF-8 par orjson (dates, datetimes et tableaux NumPy natifs) ; les
+objets qu'il ne connaît pas, comme les modèles Pydantic, passent par
+jsonable_encoder. La sortie n'est pas identique octet pour octet (NaN
+rendu null, exposants des flottants : 1e16 contre 1e+16) : option à activer
+après vérification des clients.
+"""
+import json
+import os
+
+from fastapi.encoders import jsonable_encoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FAST_JSON = orjson is not None and os.getenv("FAST_JSON", "false").lower() in ("1", "true", "yes")
+
+
+def dumps(data):
+    """Objet Python -> JSON compact en bytes"""
+    if FAST_JSON:
+        return orjson.dumps(data, default=jsonable_encoder, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(
+        jsonable_encoder(data), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
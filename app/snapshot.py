@@ -0,0 +1,119 @@
+"""
+Instantané du marché pour /snapshot.
+
+latest_prices garde, pour chaque ticker, le dernier cours et ses variations
+depuis la veille et sur quelques périodes fixes. Le chargeur la met à jour
+pour les tickers qu'il vient d'écrire puis aligne la version "snapshot"
+sur la version "prices" ; tant que les deux diffèrent, l'API recalcule
+l'instantané directement depuis stock_prices (même requête, sans écriture).
+
+Chaque cours de référence est le dernier cours à la date voulue ou avant,
+lu sur l'index (ticker, date DESC) : quelques lectures d'index par ticker.
+"""
+from sqlalchemy import select, text
+
+from async_database import versions_match_async
+from database import Company, LatestPrice, sync_data_version, versions_match
+
+SNAPSHOT_VERSION = "snapshot"
+
+# Colonne -> condition sur la date du cours de référence
+PERIODS = {
+    "change_1d": "date < l.date",
+    "change_1w": "date <= l.date - 7",
+    "change_1m": "date <= (l.date - interval '1 month')::date",
+    "change_3m": "date <= (l.date - interval '3 months')::date",
+    "change_ytd": "date < date_trunc('year', l.date)::date",
+    "change_1y": "date <= (l.date - interval '1 year')::date",
+}
+
+SNAPSHOT_COLUMNS = (
+    "ticker, date, open, high, low, close, volume, prev_close, "
+    + ", ".join(PERIODS)
+)
+
+SNAPSHOT_SELECT = """
+    SELECT c.ticker, l.date, l.open, l.high, l.low, l.close, l.volume,
+           r0.close AS prev_close,
+           {changes}
+    FROM companies c
+    CROSS JOIN LATERAL (
+        SELECT date, open, high, low, close, volume
+        FROM stock_prices
+        WHERE ticker = c.ticker
+        ORDER BY date DESC
+        LIMIT 1
+    ) l
+    {references}
+""".format(
+    changes=",\n           ".join(
+        f"100 * (l.close - r{i}.close) / NULLIF(r{i}.close, 0) AS {column}"
+        for i, column in enumerate(PERIODS)
+    ),
+    references="\n    ".join(
+        f"""LEFT JOIN LATERAL (
+        SELECT close FROM stock_prices
+        WHERE ticker = c.ticker AND {condition}
+        ORDER BY date DESC
+        LIMIT 1
+    ) r{i} ON true"""
+        for i, condition in enumerate(PERIODS.values())
+    ),
+)
+
+SNAPSHOT_QUERY = text(SNAPSHOT_SELECT + " ORDER BY c.ticker")
+
+REFRESH_SQL = text(f"""
+    INSERT INTO latest_prices ({SNAPSHOT_COLUMNS})
+    {SNAPSHOT_SELECT}
+    WHERE c.ticker = ANY(:tickers)
+    ON CONFLICT (ticker) DO UPDATE SET
+    {", ".join(f"{col} = EXCLUDED.{col}" for col in SNAPSHOT_COLUMNS.split(", ")[1:])}
+""")
+
+
+def refresh_snapshot(db, tickers=None):
+    """Recalcule latest_prices pour les tickers donnés (tous avec None)
+
+    Ne committe pas.
+    """
+    if tickers is None:
+        db.query(LatestPrice).delete()
+        tickers = [ticker for (ticker,) in db.query(Company.ticker)]
+    db.execute(REFRESH_SQL, {"tickers": list(tickers)})
+    sync_data_version(db, SNAPSHOT_VERSION)
+
+
+def snapshot_is_current_sync(db):
+    """Vrai si latest_prices reflète la dernière écriture du chargeur"""
+    return versions_match(db, SNAPSHOT_VERSION)
+
+
+async def snapshot_is_current(db):
+    """Équivalent asynchrone de snapshot_is_current_sync"""
+    return await versions_match_async(db, SNAPSHOT_VERSION)
+
+
+async def latest_known_date(db, ticker):
+    """Date du dernier cours connu de latest_prices (None si absent)
+
+    Même périmée, elle ne dépasse pas le dernier cours réel tant que le
+    chargeur n'efface pas de lignes : elle sert de borne basse aux
+    lectures récentes de stock_prices pour n'en lire que la dernière
+    partition.
+    """
+    return (await db.execute(
+        select(LatestPrice.date).where(LatestPrice.ticker == ticker)
+    )).scalar()
+
+
+async def load_snapshot(db):
+    """Lignes de l'instantané par ticker, depuis latest_prices si elle est
+    à jour, sinon calculées depuis stock_prices"""
+    if await snapshot_is_current(db):
+        result = await db.execute(
+            select(LatestPrice.__table__).order_by(LatestPrice.ticker)
+        )
+    else:
+        result = await db.execute(SNAPSHOT_QUERY)
+    return result.mappings().all()
@@ -2,7 +2,13 @@ import streamlit as st
 import requests
 import pandas as pd
 import plotly.graph_objects as go
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import os
 # Configuration de la page
 st.set_page_config(
@@ -14,32 +20,132 @@ from dotenv import load_dotenv
 load_dotenv()  # force le chargement du .env si présent
 
 API_URL = os.getenv("API_URL", "http://localhost:8000")
-st.write("API_URL (env) =", os.getenv("API_URL"))
-st.write("API_URL (var) =", API_URL)
-
-# test d'appel simple
-try:
-    r = requests.get(f"{API_URL}/docs", timeout=5)
-    st.write("Test GET /docs ->", r.status_code, r.url)
-except Exception as e:
-    st.write("Erreur test GET ->", str(e))
+
+# Délai maximal d'un appel API (secondes)
+REQUEST_TIMEOUT = 10
+# Durée de vie du cache côté dashboard : les référentiels changent rarement
+STATIC_TTL = 3600
+DATA_TTL = 300
+STATIC_ENDPOINTS = ("/companies", "/sectors")
+# Réponses gardées au plus pour la revalidation par ETag (toutes sessions)
+ETAG_STORE_MAX_ENTRIES = 256
+
 # Titre principal
 st.title("📈 Dashboard CAC 40")
 st.markdown("---")
 
-st.write("API_URL utilisée :", API_URL)
+
+@st.cache_resource
+def get_session():
+    """Session HTTP partagée entre les reruns (connexions keep-alive)"""
+    session = requests.Session()
+    retry = Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class ETagStore:
+    """Dernière réponse connue de chaque endpoint, (etag, data), en LRU borné
+
+    Partagé entre sessions et threads : accès sous verrou.
+    """
+
+    def __init__(self, max_entries=ETAG_STORE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, endpoint):
+        with self._lock:
+            entry = self._entries.get(endpoint)
+            if entry is not None:
+                self._entries.move_to_end(endpoint)
+            return entry
+
+    def set(self, endpoint, etag, data):
+        with self._lock:
+            self._entries[endpoint] = (etag, data)
+            self._entries.move_to_end(endpoint)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+@st.cache_resource
+def get_etag_store():
+    return ETagStore()
+
+
+def fetch_json(endpoint):
+    """GET avec revalidation : renvoie If-None-Match et réutilise la
+    réponse précédente si l'API répond 304"""
+    store = get_etag_store()
+    headers = {}
+    known = store.get(endpoint)
+    if known:
+        headers["If-None-Match"] = known[0]
+    
+    response = get_session().get(
+        f"{API_URL}{endpoint}", headers=headers, timeout=REQUEST_TIMEOUT
+    )
+    if response.status_code == 304 and known:
+        return known[1]
+    
+    response.raise_for_status()
+    data = response.json()
+    etag = response.headers.get("ETag")
+    if etag:
+        store.set(endpoint, etag, data)
+    return data
+
+
+@st.cache_data(ttl=STATIC_TTL, show_spinner=False)
+def fetch_static(endpoint):
+    return fetch_json(endpoint)
+
+
+@st.cache_data(ttl=DATA_TTL, show_spinner=False)
+def fetch_data(endpoint):
+    return fetch_json(endpoint)
+
+
+def cached_fetch(endpoint):
+    """Choisit le cache (et donc le TTL) selon l'endpoint"""
+    if endpoint.startswith(STATIC_ENDPOINTS):
+        return fetch_static(endpoint)
+    return fetch_data(endpoint)
+
 
 def call_api(endpoint):
     """Appelle l'API et retourne les données"""
     try:
-        response = requests.get(f"{API_URL}{endpoint}")
-        response.raise_for_status()
-        return response.json()
+        return cached_fetch(endpoint)
     except Exception as e:
         st.error(f"Erreur lors de l'appel API: {str(e)}")
         return None
 
 
+def call_api_many(*endpoints):
+    """Appelle plusieurs endpoints indépendants en parallèle"""
+    # Les threads héritent du contexte du script pour utiliser st.cache_data
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(
+        max_workers=len(endpoints),
+        initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)
+    ) as pool:
+        futures = [pool.submit(cached_fetch, endpoint) for endpoint in endpoints]
+    
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            st.error(f"Erreur lors de l'appel API: {str(e)}")
+            results.append(None)
+    return results
+
+
 # Sidebar pour la navigation
 page = st.sidebar.selectbox(
     "Navigation",
@@ -50,20 +156,39 @@ page = st.sidebar.selectbox(
 if page == "Vue d'ensemble":
     st.header("Vue d'ensemble du CAC 40")
     
-    # Récupération des données de santé
+    # Résumé de santé calculé en tâche de fond par l'API (aucun comptage complet)
     health = call_api("/health")
     if health:
-        col1, col2, col3 = st.columns(3)
+        col1, col2, col3, col4 = st.columns(4)
         with col1:
             st.metric("Entreprises", health.get("companies", 0))
         with col2:
-            st.metric("Enregistrements", health.get("price_records", 0))
+            records = health.get("price_records", 0)
+            prefix = "≈ " if health.get("price_records_estimated") else ""
+            st.metric("Enregistrements", f"{prefix}{records:,}".replace(",", " "))
         with col3:
+            st.metric("Dernière cotation", health.get("last_date") or "—")
+        with col4:
             status = health.get("status", "unknown")
             st.metric("Statut", status)
     
     st.markdown("---")
     
+    # Instantané du marché : une seule requête pour tous les tickers
+    snapshot = call_api("/snapshot")
+    if snapshot and snapshot["tickers"]:
+        st.subheader(f"Séance du {snapshot['date']}")
+        df = pd.DataFrame(snapshot["tickers"])
+        df = df.join(pd.json_normalize(df.pop("changes")).add_prefix("var. "))
+        st.dataframe(
+            df[['ticker', 'name', 'close', 'change_pct', 'var. 1m', 'var. ytd', 'var. 1y']]
+            .sort_values('change_pct', ascending=False)
+            .rename(columns={'name': 'Entreprise', 'close': 'Clôture', 'change_pct': 'var. jour'}),
+            hide_index=True,
+            use_container_width=True
+        )
+        st.markdown("---")
+    
     # Liste des entreprises par secteur
     st.subheader("Entreprises par secteur")
     companies = call_api("/companies")
@@ -116,11 +241,14 @@ elif page == "Analyse d'entreprise":
         # Période d'analyse
         col1, col2 = st.columns(2)
         with col1:
-            days = st.slider("Période (jours)", 7, 365, 90)
+            # Nombre de dernières cotations par entreprise, comme avant /compare
+            limit = st.slider("Période (jours)", 7, 365, 90)
         
-        # Récupération des données
-        prices = call_api(f"/prices/{ticker}?limit={days}")
-        stats = call_api(f"/statistics/{ticker}?days={days}")
+        # Récupération des données (les deux appels en parallèle)
+        prices, stats = call_api_many(
+            f"/prices/{ticker}?limit={days}",
+            f"/statistics/{ticker}?days={days}"
+        )
         
         if stats:
             st.subheader(f"Statistiques - {stats['name']}")
@@ -206,26 +334,25 @@ elif page == "Comparaison":
         )
         
         if selected_companies:
-            days = st.slider("Période (jours)", 7, 365, 90)
+            # Nombre de dernières cotations par entreprise, comme avant /compare
+            limit = st.slider("Période (jours)", 7, 365, 90)
             
             fig = go.Figure()
             
-            for company in selected_companies:
-                ticker = company_dict[company]
-                prices = call_api(f"/prices/{ticker}?limit={days}")
+            # Une seule requête : séries déjà rebasées à 100 sur un axe commun
+            params = "&".join(f"tickers={company_dict[c]}" for c in selected_companies)
+            comparison = call_api(f"/compare?{params}&limit={limit}")
+            
+            if comparison:
+                dates = pd.to_datetime(comparison['dates'])
                 
-                if prices:
-                    df = pd.DataFrame(prices)
-                    df['date'] = pd.to_datetime(df['date'])
-                    df = df.sort_values('date')
-                    
-                    # Normalisation à 100 pour comparaison
-                    df['normalized'] = (df['close'] / df['close'].iloc[0]) * 100
-                    
+                for company in selected_companies:
+                    ticker = company_dict[company]
                     fig.add_trace(go.Scatter(
-                        x=df['date'],
-                        y=df['normalized'],
+                        x=dates,
+                        y=comparison['series'].get(ticker, []),
                         mode='lines',
+                        connectgaps=True,
                         name=company.split('(')[0].strip()
                     ))
             
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Test de charge de l'API : latences p50/p95/p99 et requêtes par seconde.
+
+Chaque endpoint reçoit --requests requêtes envoyées par --concurrency
+threads (une session HTTP par thread). Les tickers sont tirés au hasard
+parmi ceux de /companies qui ont des cours, avec une graine fixe pour que
+deux exécutions envoient la même séquence. Les réponses passent par le cache de l'API :
+relancer l'API (ou le chargeur) avant une mesure à froid.
+
+Lancer : python benchmarks/bench_api.py --url http://localhost:8000
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+API_URL = "http://localhost:8000"
+REQUEST_TIMEOUT = 30
+# Tickers tirés parmi ceux de /companies qui ont des cours
+SAMPLE_TICKERS = 100
+
+# nom -> chemin ({ticker} et {other} sont remplacés à chaque requête)
+ENDPOINTS = {
+    "companies": "/companies",
+    "sectors": "/sectors",
+    "prices": "/prices/{ticker}?limit=100",
+    "latest": "/latest/{ticker}",
+    "snapshot": "/snapshot",
+    "statistics": "/statistics/{ticker}?days=365",
+    "top_performers": "/top-performers?days=30&limit=10",
+    "indicators": "/indicators/{ticker}?indicators=sma:50&indicators=rsi&days=365",
+    "compare": "/compare?tickers={ticker}&tickers={other}&days=365",
+    "correlation": "/correlation?days=365",
+    "index": "/indices/equal_weight",
+    "backtest": "/backtest?strategy=momentum&lookback=20&lookback=60&top=3&top=5",
+    "health": "/health",
+}
+
+
+def summarize(latencies, errors, elapsed):
+    """Latences (s) -> percentiles en ms et débit"""
+    if not latencies:
+        return {"requests": 0, "errors": errors}
+    ms = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "max_ms": round(float(ms.max()), 2),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+    }
+
+
+def bench_endpoint(url, path, tickers, requests_count, concurrency, seed=0):
+    rng = random.Random(seed)
+    paths = [
+        path.format(ticker=rng.choice(tickers), other=rng.choice(tickers))
+        for _ in range(requests_count)
+    ]
+    local = threading.local()
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def call(target):
+        nonlocal errors
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            ok = session.get(url + target, timeout=REQUEST_TIMEOUT).status_code < 400
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            errors += not ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, paths))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def bench_api(url=API_URL, requests_count=200, concurrency=8, endpoints=None, warmup=10):
+    """Mesure chaque endpoint ; retourne {endpoint: statistiques}"""
+    companies = requests.get(f"{url}/companies", timeout=REQUEST_TIMEOUT).json()
+    candidates = sorted(c["ticker"] for c in companies)
+    candidates = random.Random(0).sample(candidates, min(SAMPLE_TICKERS, len(candidates)))
+    tickers = [
+        ticker for ticker in candidates
+        if requests.get(f"{url}/latest/{ticker}", timeout=REQUEST_TIMEOUT).ok
+    ]
+    if not tickers:
+        raise RuntimeError("Aucune entreprise en base : lancer d'abord benchmarks/seed.py")
+
+    results = {}
+    for name in endpoints or ENDPOINTS:
+        path = ENDPOINTS[name]
+        if warmup:
+            bench_endpoint(url, path, tickers, warmup, 1, seed=1)
+        results[name] = bench_endpoint(url, path, tickers, requests_count, concurrency)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Test de charge de l'API")
+    parser.add_argument("--url", default=API_URL, help="URL de l'API")
+    parser.add_argument("--requests", type=int, default=200, help="Requêtes par endpoint")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requêtes simultanées")
+    parser.add_argument("--warmup", type=int, default=10, help="Requêtes de chauffe non mesurées")
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS))
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print(f"🔥 Charge : {args.requests} requêtes × {args.concurrency} threads sur {args.url}\n")
+    results = bench_api(args.url, args.requests, args.concurrency, args.endpoints, args.warmup)
+    for name, r in results.items():
+        if not r["requests"]:
+            continue
+        print(f"   {name:15s} p50 {r['p50_ms']:>8.1f} ms  p95 {r['p95_ms']:>8.1f} ms  "
+              f"p99 {r['p99_ms']:>8.1f} ms  {r['rps']:>8.1f} req/s  erreurs {r['errors']}")
+    print()
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Débit (lignes/s) des chemins d'ingestion.
+
+Chaque chemin écrit les mêmes tickers fictifs (préfixe BENCH), alimentés
+par SyntheticSource, dans une table vidée au préalable :
+
+- row_by_row : load_stock_data(bulk=False), une requête SELECT + INSERT par jour
+- bulk       : load_stock_data(bulk=True), INSERT ... ON CONFLICT groupés
+- pipeline   : load_all_stock_data, téléchargements parallèles et écrivain unique
+- neon_script: INSERT unitaires psycopg2 avec commit par ticker (ancienne
+               boucle de load_to_neon.py)
+- copy       : copy_load_all (mode --copy), COPY + fusion sur plusieurs connexions
+
+Lancer : python benchmarks/bench_loader.py --tickers 10 --years 2
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from sqlalchemy import delete, func, select
+
+from database import init_db, SessionLocal, StockPrice, engine
+from migrations import migrate
+from partitions import ensure_partitions
+from load_data import load_stock_data, load_all_stock_data, dataframe_to_rows
+from copy_loader import copy_load_all
+from synthetic import SyntheticSource, synthetic_companies
+
+PREFIX = "BENCH"
+PATHS = ("row_by_row", "bulk", "pipeline", "neon_script", "copy")
+
+
+def clear(db):
+    db.execute(delete(StockPrice).where(StockPrice.ticker.like(f"{PREFIX}%")))
+    db.commit()
+
+
+def count(db):
+    return db.execute(
+        select(func.count()).select_from(StockPrice)
+        .where(StockPrice.ticker.like(f"{PREFIX}%"))
+    ).scalar()
+
+
+def run_row_by_row(db, tickers, start_date, end_date, source):
+    for ticker in tickers:
+        load_stock_data(db, ticker, start_date, end_date, bulk=False, source=source)
+
+
+def run_bulk(db, tickers, start_date, end_date, source):
+    for ticker in tickers:
+        load_stock_data(db, ticker, start_date, end_date, bulk=True, source=source)
+
+
+def run_pipeline(db, tickers, start_date, end_date, source):
+    load_all_stock_data(
+        db, {ticker: start_date for ticker in tickers}, end_date,
+        source=source, rate=1e9
+    )
+
+
+def run_neon_script(db, tickers, start_date, end_date, source):
+    # Reproduit l'ancienne boucle d'insertion de load_to_neon.py sur une connexion psycopg2
+    with engine.begin() as ddl:
+        ensure_partitions(ddl, "stock_prices", start_date, end_date)
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        for ticker in tickers:
+            hist = source.history(ticker, start_date, end_date)
+            for date, row in hist.iterrows():
+                cur.execute(
+                    """
+                    INSERT INTO stock_prices (ticker, date, open, high, low, close, volume, adj_close)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (ticker, date) DO NOTHING
+                    """,
+                    (ticker, date.date(), float(row['Open']), float(row['High']),
+                     float(row['Low']), float(row['Close']), float(row['Volume']), float(row['Close']))
+                )
+            conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+
+
+def run_copy(db, tickers, start_date, end_date, source):
+    db.commit()
+    copy_load_all(
+        engine, {ticker: start_date for ticker in tickers}, end_date,
+        dataframe_to_rows, source=source
+    )
+
+
+RUNNERS = {
+    "row_by_row": run_row_by_row,
+    "bulk": run_bulk,
+    "pipeline": run_pipeline,
+    "neon_script": run_neon_script,
+    "copy": run_copy,
+}
+
+
+def bench_loader(tickers=10, years=2, paths=PATHS, quiet=True):
+    """Mesure chaque chemin ; retourne {chemin: {"rows", "seconds", "rows_per_sec"}}"""
+    init_db()
+    migrate()
+
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=int(365.25 * years))
+    names = list(synthetic_companies(tickers, prefix=PREFIX))
+    source = SyntheticSource()
+
+    results = {}
+    db = SessionLocal()
+    try:
+        for path in paths:
+            clear(db)
+            started = time.perf_counter()
+            output = io.StringIO() if quiet else sys.stdout
+            with contextlib.redirect_stdout(output):
+                RUNNERS[path](db, names, start_date, end_date, source)
+            elapsed = time.perf_counter() - started
+
+            rows = count(db)
+            results[path] = {
+                "rows": rows,
+                "seconds": round(elapsed, 3),
+                "rows_per_sec": round(rows / elapsed, 1) if elapsed else None,
+            }
+        clear(db)
+    finally:
+        db.close()
+
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Débit des chemins d'ingestion")
+    parser.add_argument("--tickers", type=int, default=10, help="Tickers par chemin")
+    parser.add_argument("--years", type=float, default=2, help="Années d'historique")
+    parser.add_argument("--paths", nargs="+", choices=PATHS, default=list(PATHS))
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print(f"⏱️  Ingestion : {args.tickers} tickers × {args.years:g} ans par chemin\n")
+    results = bench_loader(args.tickers, args.years, args.paths)
+    for path, result in results.items():
+        print(f"   {path:12s} {result['rows']:>8,} lignes  {result['seconds']:>8.2f}s  "
+              f"{result['rows_per_sec']:>10,.0f} lignes/s")
+    print()
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Suite de benchmarks complète : seed, charge de l'API et débit du chargeur.
+
+Les résultats sont écrits en JSON (benchmarks/results/ par défaut). Avec
+--baseline, chaque mesure est comparée à un résultat précédent : une
+latence p95 ou un débit qui se dégrade de plus de --tolerance est signalé
+et le script sort avec le code 1.
+
+Lancer : python benchmarks/run.py --tickers 200 --years 10 --start-api
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import requests
+
+from bench_api import bench_api, API_URL
+from bench_loader import bench_loader
+from seed import seed
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, "..", "app")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_api(port):
+    """Lance uvicorn en sous-processus et attend /health"""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--port", str(port), "--log-level", "warning"],
+        cwd=APP_DIR
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(60):
+        try:
+            if requests.get(f"{url}/health", timeout=1).ok:
+                return process, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("L'API n'a pas démarré")
+
+
+def compare(results, baseline, tolerance):
+    """Liste des régressions par rapport à un résultat précédent"""
+    regressions = []
+    for name, current in results.get("api", {}).items():
+        before = baseline.get("api", {}).get(name)
+        if before and before.get("p95_ms") and current.get("p95_ms"):
+            if current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                regressions.append(
+                    f"api.{name}: p95 {before['p95_ms']} → {current['p95_ms']} ms"
+                )
+
+    # Débits : chemins du chargeur et seed
+    throughputs = {**results.get("loader", {}), "seed": results.get("seed")}
+    before_throughputs = {**baseline.get("loader", {}), "seed": baseline.get("seed")}
+    for name, current in throughputs.items():
+        before = before_throughputs.get(name)
+        if before and current and before.get("rows_per_sec") and current.get("rows_per_sec"):
+            if current["rows_per_sec"] < before["rows_per_sec"] * (1 - tolerance):
+                regressions.append(
+                    f"{name}: {before['rows_per_sec']:,} → {current['rows_per_sec']:,} lignes/s"
+                )
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Suite de benchmarks CAC 40")
+    parser.add_argument("--tickers", type=int, default=40, help="Tickers synthétiques à charger")
+    parser.add_argument("--years", type=float, default=10, help="Années d'historique")
+    parser.add_argument("--skip-seed", action="store_true", help="Réutilise les données en base")
+    parser.add_argument("--url", default=API_URL, help="URL de l'API à tester")
+    parser.add_argument("--start-api", action="store_true",
+                        help="Lance l'API localement au lieu d'utiliser --url")
+    parser.add_argument("--port", type=int, default=8765, help="Port de l'API lancée par --start-api")
+    parser.add_argument("--requests", type=int, default=200, help="Requêtes par endpoint")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requêtes simultanées")
+    parser.add_argument("--loader-tickers", type=int, default=10, help="Tickers par chemin d'ingestion")
+    parser.add_argument("--loader-years", type=float, default=2, help="Années par chemin d'ingestion")
+    parser.add_argument("--skip-api", action="store_true")
+    parser.add_argument("--skip-loader", action="store_true")
+    parser.add_argument("--output", help="Fichier JSON de sortie")
+    parser.add_argument("--baseline", help="Résultat JSON de référence")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Dégradation tolérée avant de signaler une régression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "tickers": args.tickers,
+            "years": args.years,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        }
+    }
+
+    if not args.skip_seed:
+        print(f"🌱 Seed : {args.tickers} tickers × {args.years:g} ans...")
+        results["seed"] = seed(args.tickers, args.years, reset=True)
+        print(f"   {results['seed']['rows']:,} lignes, {results['seed']['rows_per_sec']:,} lignes/s\n")
+
+    if not args.skip_api:
+        process = None
+        url = args.url
+        if args.start_api:
+            process, url = start_api(args.port)
+        try:
+            print(f"🔥 Charge de l'API ({url})...")
+            results["api"] = bench_api(url, args.requests, args.concurrency)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+        for name, r in results["api"].items():
+            if r["requests"]:
+                print(f"   {name:15s} p50 {r['p50_ms']:>8.1f}  p95 {r['p95_ms']:>8.1f}  "
+                      f"p99 {r['p99_ms']:>8.1f} ms  {r['rps']:>8.1f} req/s  erreurs {r['errors']}")
+        print()
+
+    if not args.skip_loader:
+        print(f"⏱️  Ingestion : {args.loader_tickers} tickers × {args.loader_years:g} ans par chemin...")
+        results["loader"] = bench_loader(args.loader_tickers, args.loader_years)
+        for path, r in results["loader"].items():
+            print(f"   {path:12s} {r['rows_per_sec']:>10,.0f} lignes/s")
+        print()
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"bench-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Résultats : {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} régression(s) au-delà de {args.tolerance:.0%} :")
+            for regression in regressions:
+                print(f"   - {regression}")
+            return 1
+        print(f"\n✅ Aucune régression au-delà de {args.tolerance:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Remplit la base (DATABASE_URL) avec des données synthétiques.
+
+Les entreprises fictives sont ajoutées à la table companies, puis
+l'historique est écrit par le pipeline de app/load_data.py alimenté par
+SyntheticSource. Les agrégats et, si configuré, le store de prix sont
+reconstruits comme après un chargement normal.
+
+Lancer : python benchmarks/seed.py --tickers 200 --years 10
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from database import init_db, SessionLocal, Company, StockPrice, bump_data_version
+from migrations import migrate
+from load_data import load_all_stock_data
+from rollup import refresh_rollups
+from snapshot import refresh_snapshot
+from indices import refresh_index_levels
+from price_store import write_price_store, PRICE_STORE_DIR
+from synthetic import SyntheticSource, synthetic_companies
+
+
+def seed_companies(db, companies):
+    db.execute(
+        pg_insert(Company)
+        .values([{"ticker": t, **info} for t, info in companies.items()])
+        .on_conflict_do_nothing(index_elements=["ticker"])
+    )
+    bump_data_version(db)
+    db.commit()
+
+
+def clear_synthetic(db, prefix="SYN"):
+    """Supprime les données synthétiques d'un précédent seed"""
+    pattern = f"{prefix}%"
+    db.execute(delete(StockPrice).where(StockPrice.ticker.like(pattern)))
+    db.execute(delete(Company).where(Company.ticker.like(pattern)))
+    bump_data_version(db)
+    db.commit()
+
+
+def seed(tickers, years, workers=8, reset=False, quiet=True):
+    """Charge tickers × years ans de cours synthétiques
+
+    Retourne {"tickers", "rows", "seconds", "rows_per_sec"}.
+    """
+    init_db()
+    migrate()
+
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=int(365.25 * years))
+    companies = synthetic_companies(tickers)
+
+    db = SessionLocal()
+    try:
+        if reset:
+            clear_synthetic(db)
+        seed_companies(db, companies)
+
+        started = time.perf_counter()
+        output = io.StringIO() if quiet else sys.stdout
+        with contextlib.redirect_stdout(output):
+            stats = load_all_stock_data(
+                db, {ticker: start_date for ticker in companies}, end_date,
+                source=SyntheticSource(), workers=workers, rate=1e9
+            )
+        elapsed = time.perf_counter() - started
+
+        refresh_rollups(db)
+        refresh_snapshot(db)
+        refresh_index_levels(db)
+        db.commit()
+        if PRICE_STORE_DIR:
+            write_price_store(db)
+    finally:
+        db.close()
+
+    return {
+        "tickers": tickers,
+        "rows": stats["inserted"],
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(stats["inserted"] / elapsed, 1) if elapsed else None,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Données synthétiques pour les benchmarks")
+    parser.add_argument("--tickers", type=int, default=40, help="Nombre de tickers fictifs")
+    parser.add_argument("--years", type=float, default=10, help="Années d'historique")
+    parser.add_argument("--workers", type=int, default=8, help="Générateurs simultanés")
+    parser.add_argument("--reset", action="store_true",
+                        help="Supprime d'abord les données synthétiques existantes")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print(f"🌱 Seed : {args.tickers} tickers × {args.years:g} ans...")
+    result = seed(args.tickers, args.years, workers=args.workers, reset=args.reset)
+    print(f"✅ {result['rows']:,} lignes en {result['seconds']}s "
+          f"({result['rows_per_sec']:,} lignes/s)")
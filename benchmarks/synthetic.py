@@ -0,0 +1,60 @@
+"""
+Données synthétiques pour les benchmarks.
+
+SyntheticSource remplace Yahoo Finance : elle expose la même méthode
+history(ticker, start_date, end_date) que les sources de app/ingest.py et
+produit des cours déterministes (marche aléatoire géométrique dont la
+graine dépend du ticker), sans réseau ni limite de débit.
+"""
+import zlib
+
+import numpy as np
+import pandas as pd
+
+SECTORS = [
+    "Industrials", "Materials", "Financials", "Consumer Discretionary",
+    "Consumer Staples", "Healthcare", "Energy", "Technology", "Utilities",
+    "Telecom", "Real Estate",
+]
+
+
+def synthetic_companies(count, prefix="SYN"):
+    """{ticker: {"name", "sector"}} de count entreprises fictives"""
+    return {
+        f"{prefix}{i:04d}.PA": {
+            "name": f"Synthétique {i}",
+            "sector": SECTORS[i % len(SECTORS)],
+        }
+        for i in range(count)
+    }
+
+
+class SyntheticSource:
+    """Source locale au format yfinance (jours ouvrés, colonnes OHLCV)"""
+
+    def __init__(self, volatility=0.015):
+        self.volatility = volatility
+
+    def history(self, ticker, start_date, end_date):
+        # end_date exclusive, comme yfinance
+        index = pd.bdate_range(
+            pd.Timestamp(start_date).normalize(),
+            pd.Timestamp(end_date).normalize() - pd.Timedelta(days=1),
+            tz="Europe/Paris"
+        )
+        rng = np.random.default_rng(zlib.crc32(ticker.encode()))
+
+        # Le niveau de départ dépend de la date : deux fenêtres successives
+        # d'un même ticker restent cohérentes sans être identiques
+        start = 20 + zlib.crc32(f"{ticker}{start_date:%Y%m%d}".encode()) % 400
+        steps = rng.normal(0.0002, self.volatility, len(index))
+        close = start * np.exp(np.cumsum(steps))
+        spread = np.abs(rng.normal(0, self.volatility / 2, len(index)))
+
+        return pd.DataFrame({
+            "Open": close * (1 + rng.normal(0, self.volatility / 4, len(index))),
+            "High": close * (1 + spread),
+            "Low": close * (1 - spread),
+            "Close": close,
+            "Volume": rng.integers(100_000, 5_000_000, len(index)).astype(float),
+        }, index=index)
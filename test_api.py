@@ -53,10 +53,14 @@ def main():
     tests = [
         ("Root endpoint", "/", ["message", "version"]),
         ("Health check", "/health", ["status", "companies"]),
+        ("Liveness", "/health/live", ["alive"]),
         ("Companies list", "/companies", ["ticker", "name"]),
         ("Sectors list", "/sectors", ["sectors"]),
         ("Stock prices (LVMH)", "/prices/MC.PA?limit=10", ["ticker", "date"]),
         ("Latest price (Total)", "/latest/FP.PA", ["ticker", "close"]),
+        ("Market snapshot", "/snapshot", ["tickers", "change_pct"]),
+        ("Equal-weight index", "/indices/equal_weight", ["levels"]),
+        ("Backtest (MA crossover)", "/backtest?fast=20&slow=50&slow=100", ["results", "sharpe"]),
         ("Statistics (Airbus)", "/statistics/AIR.PA?days=30", ["ticker", "avg_close"]),
         ("Top performers", "/top-performers?days=30&limit=5", ["top_performers"]),
     ]
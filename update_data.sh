@@ -10,9 +10,10 @@ if ! docker-compose ps | grep -q "Up"; then
     sleep 10
 fi
 
-# Mise à jour des données
+# Mise à jour incrémentale (seuls les jours manquants sont téléchargés).
+# Passer --full pour forcer un rechargement complet : ./update_data.sh --full
 echo "📊 Téléchargement des dernières données..."
-docker-compose exec -T app python /app/load_data.py
+docker-compose exec -T app python /app/load_data.py "$@"
 
 echo ""
 echo "✅ Mise à jour terminée !"